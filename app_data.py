@@ -0,0 +1,119 @@
+"""
+CrowdAID - Shared Streamlit Resources
+Data dan resource yang di-cache sekali per proses dan dipakai bersama oleh
+app.py dan halaman-halaman di pages/
+"""
+
+import streamlit as st
+
+from emergency_index import EmergencyIndex
+from occupancy_refresher import OccupancyRefresher, OccupancySummary, OCCUPANCY_PATH
+from occupancy_rollups import OccupancyRollups
+from recommender import RegionViews
+from scoring import HospitalScorer
+from search_index import SearchIndex
+from shard_store import ShardStore
+from surge_detector import SurgeDetector
+
+
+# Immutable data + flattened model, memory-mapped and shared by all workers
+@st.cache_resource
+def get_serving_state():
+    try:
+        from serving_state import ServingState
+        return ServingState.load_or_publish()
+    except Exception as e:
+        # Fall back to per-process CSV shards and pickled model
+        print(f"⚠️ Serving state tidak tersedia: {e}")
+        return None
+
+
+# Hospital/Faskes data is loaded lazily per kabupaten from on-disk shards
+@st.cache_resource
+def get_shard_store():
+    return ShardStore(shared=get_serving_state())
+
+
+# Prebuilt trigram index over all hospital and Faskes names/addresses
+@st.cache_resource
+def get_search_index(_store):
+    return SearchIndex.load_or_build(_store)
+
+
+# Occupancy data is refreshed by a background thread, shared across sessions
+@st.cache_resource
+def get_occupancy_refresher():
+    refresher = OccupancyRefresher(path=OCCUPANCY_PATH)
+    refresher.start()
+    return refresher
+
+
+# ML suitability is computed once per hospital, as shards are loaded
+@st.cache_resource
+def get_scorer():
+    state = get_serving_state()
+    if state is not None:
+        return state.scorer()
+    try:
+        from ml_predictor import CrowdAIDPredictor
+        return HospitalScorer(CrowdAIDPredictor())
+    except Exception as e:
+        # Fall back to rule-based ranking if the model cannot be loaded
+        print(f"⚠️ ML model tidak tersedia: {e}")
+        return None
+
+
+# Historical rollups, kept up to date by the occupancy refresher
+@st.cache_resource
+def get_rollups(_refresher):
+    rollups = OccupancyRollups.load_or_build(get_shard_store())
+
+    def ingest_snapshot(snapshot):
+        # Append only the new rows to the journal instead of re-pickling everything
+        if not snapshot.is_dummy and rollups.ingest(snapshot.df_occupancy):
+            rollups.append_journal(snapshot.df_occupancy)
+
+    _refresher.add_listener(ingest_snapshot)
+    return rollups
+
+
+# Online surge detector, warmed up from history and fed by the refresher
+@st.cache_resource
+def get_surge_detector(_refresher):
+    detector = SurgeDetector.load_or_build(get_shard_store())
+
+    def update_snapshot(snapshot):
+        if snapshot.is_dummy:
+            return
+        watermark = detector.watermark
+        detector.update(snapshot.df_occupancy)
+        if detector.watermark != watermark:
+            detector.save()
+
+    _refresher.add_listener(update_snapshot)
+    return detector
+
+
+# Emergency (Darurat) rankings, patched for changed hospitals on every occupancy update
+@st.cache_resource
+def get_emergency_index(_store, _refresher):
+    # Hospital table read straight from the shard files, outside the LRU
+    index = EmergencyIndex.from_store(_store)
+    _refresher.add_listener(index.update_snapshot)
+    return index
+
+
+# Sidebar occupancy stats, updated from each snapshot's change set
+@st.cache_resource
+def get_occupancy_summary(_refresher):
+    summary = OccupancySummary()
+    _refresher.add_listener(summary.update)
+    return summary
+
+
+# Per-kabupaten merged hospital + occupancy views, re-merged only where rows changed
+@st.cache_resource
+def get_region_views(_store, _refresher):
+    views = RegionViews(_store)
+    _refresher.add_listener(views.update)
+    return views
@@ -0,0 +1,339 @@
+"""
+CrowdAID - Emergency Index
+Jalur cepat untuk urgensi Darurat: per kabupaten dan kondisi disimpan
+daftar terurut hospital yang masih punya bed, diurutkan berdasarkan bed
+tersedia, waktu tunggu dan jarak (kabupaten sendiri, lalu kabupaten
+tetangga). Dibangun ulang setiap update occupancy (atau hanya untuk
+hospital yang berubah, jika snapshot membawa change set) dan di-swap secara
+atomik, sehingga lookup tetap O(1) selama refresh.
+
+Usage:
+    python emergency_index.py "Kota Serang" 3
+"""
+
+import bisect
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from recommender import NEIGHBOURS, merge_occupancy
+
+
+# Hospital yang boleh menerima pasien darurat per kondisi: RS Umum dengan
+# kelas yang sama atau lebih tinggi dari rute normal, ditambah RS Khusus
+# yang sesuai (pola jenis)
+EMERGENCY_ELIGIBILITY = {
+    "1": (('B', 'C', 'D'), None),               # Gejala Ringan -> IGD terdekat
+    "2": (('B', 'C'), None),                    # Penyakit Dalam
+    "3": (('B', 'C'), 'Bedah'),                 # Bedah
+    "4": (('B', 'C'), 'Ibu dan Anak'),          # Anak
+    "5": (('B', 'C'), 'Ibu dan Anak'),          # Kebidanan
+    "6": (('B', 'C', 'D'), None),               # Gigi
+    "7": (('B',), None)                         # Banyak Spesialis
+}
+
+# Jumlah kandidat yang disiapkan per (kabupaten, kondisi)
+EMERGENCY_CANDIDATES = 3
+
+# Urutan jarak tanpa koordinat: kabupaten sendiri, tetangga, lainnya
+LOCAL, NEARBY, FARTHER = 0, 1, 2
+
+
+class EmergencyTable:
+    """
+    Immutable hasil satu build
+
+    Attributes:
+        rankings: dict (kab, kondisi) -> list entry hospital dengan bed di
+                  kabupaten itu, terurut penuh ([0] terbaik); kab None
+                  berisi semua kabupaten
+        candidates: dict (kab, kondisi) -> tuple entry terbaik termasuk
+                    fallback ke kabupaten tetangga/lainnya
+        snapshot_time: datetime - waktu data occupancy
+    """
+
+    __slots__ = ('rankings', 'candidates', 'snapshot_time')
+
+    def __init__(self, rankings, candidates, snapshot_time):
+        object.__setattr__(self, 'rankings', rankings)
+        object.__setattr__(self, 'candidates', candidates)
+        object.__setattr__(self, 'snapshot_time', snapshot_time)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EmergencyTable is immutable")
+
+
+class EmergencyIndex:
+    """
+    Index hospital untuk pasien darurat
+
+    Kelayakan hospital per kondisi statis dan dihitung sekali; update()
+    hanya membaca kolom occupancy, membangun list terurut per (kabupaten,
+    kondisi) dan menukar `table` dengan satu assignment. update_snapshot()
+    memakai change set snapshot untuk memindahkan (bisect) hanya hospital
+    yang berubah di list terkait. lookup() hanya satu dict get pada table
+    yang sedang aktif.
+    """
+
+    def __init__(self, df_hospital, candidates=EMERGENCY_CANDIDATES):
+        self.df_hospital = df_hospital.reset_index(drop=True)
+        self.n_candidates = candidates
+        self.kabupaten = sorted(self.df_hospital['kab'].unique())
+
+        jenis = self.df_hospital['jenis'].fillna('')
+        umum = jenis.str.contains('Umum', case=False).to_numpy()
+        kelas = self.df_hospital['kelas'].to_numpy()
+        self.eligible = {}
+        for kondisi, (kelas_allowed, khusus_pattern) in EMERGENCY_ELIGIBILITY.items():
+            mask = umum & np.isin(kelas, kelas_allowed)
+            if khusus_pattern:
+                mask |= jenis.str.contains(khusus_pattern, case=False).to_numpy()
+            self.eligible[kondisi] = mask
+
+        self.hospitals = list(zip(*[self.df_hospital[column].tolist()
+                                    for column in ('id', 'nama', 'alamat', 'kab', 'jenis', 'kelas')]))
+        self.capacity = self.df_hospital['total_tempat_tidur'].tolist()
+        self.rows_by_id = {}
+        for row, hospital in enumerate(self.hospitals):
+            self.rows_by_id.setdefault(hospital[0], []).append(row)
+
+        # State untuk update inkremental (hanya dipakai thread updater):
+        # record dan sort key per baris hospital, sort key per entry ranking
+        self._records = []
+        self._sort_keys = []
+        self._ranking_keys = {}
+        self._loaded_at = None
+        self.table = EmergencyTable({}, {}, None)
+
+    @staticmethod
+    def _entry(hospital, occupancy_rate, status, available_beds, wait_time):
+        """Record ranking dan sort key (None jika tanpa bed) untuk satu hospital"""
+        hospital_id, nama, alamat, kab, jenis, kelas = hospital
+        record = {
+            'hospital_id': hospital_id,
+            'nama': nama,
+            'alamat': alamat,
+            'kab': kab,
+            'tipe': jenis,
+            'kelas': kelas,
+            'available_beds': int(available_beds),
+            'wait_time': int(wait_time),
+            'occupancy': float(occupancy_rate),
+            'status': status
+        }
+        beds = float(available_beds)
+        # Bed terbanyak, lalu tunggu tersingkat, lalu occupancy terendah
+        sort_key = (-beds, float(wait_time), float(occupancy_rate)) if beds >= 1 else None
+        return record, sort_key
+
+    def _merged_records(self, df_merged):
+        columns = ['id', 'nama', 'alamat', 'kab', 'jenis', 'kelas', 'occupancy_rate', 'status',
+                   'available_beds', 'wait_time_minutes']
+        values = [df_merged[column].tolist() for column in columns]
+        entries = [self._entry(row[:6], *row[6:]) for row in zip(*values)]
+        return [record for record, _ in entries], [sort_key for _, sort_key in entries]
+
+    def update(self, df_occupancy, snapshot_time=None):
+        """Bangun ranking dari snapshot occupancy baru lalu swap table"""
+        df_merged = merge_occupancy(self.df_hospital, df_occupancy)
+        records, sort_keys = self._merged_records(df_merged)
+        kab = df_merged['kab'].to_numpy()
+
+        rankings, ranking_keys = {}, {}
+        for kondisi, eligible in self.eligible.items():
+            rows = [i for i in np.flatnonzero(eligible) if sort_keys[i] is not None]
+            # Urutan baris sebagai tie-breaker, sama seperti sort stabil
+            rows.sort(key=lambda i: sort_keys[i] + (i,))
+            for k in [*self.kabupaten, None]:
+                ranking_rows = rows if k is None else [i for i in rows if kab[i] == k]
+                rankings[(k, kondisi)] = [records[i] for i in ranking_rows]
+                ranking_keys[(k, kondisi)] = [sort_keys[i] + (i,) for i in ranking_rows]
+
+        candidates = {}
+        for kondisi in self.eligible:
+            for k in self.kabupaten:
+                candidates[(k, kondisi)] = self._candidates(rankings, k, kondisi)
+
+        self._records, self._sort_keys, self._ranking_keys = records, sort_keys, ranking_keys
+        self._loaded_at = None
+        self.table = EmergencyTable(rankings, candidates, snapshot_time or datetime.now())
+        return self.table
+
+    def update_snapshot(self, snapshot):
+        """
+        Update dari OccupancySnapshot: hanya hospital di change set yang
+        dipindahkan di ranking, kandidat dihitung ulang untuk kabupaten yang
+        terdampak. Tanpa change set yang cocok, bangun ulang penuh.
+        """
+        changes = snapshot.changes
+        if changes is None or changes.base_loaded_at != self._loaded_at or not self._records:
+            table = self.update(snapshot.df_occupancy, snapshot.snapshot_time)
+        else:
+            table = self._patch(changes, snapshot.snapshot_time)
+        self._loaded_at = snapshot.loaded_at
+        return table
+
+    def _patch(self, changes, snapshot_time):
+        rows = sorted(row for hospital_id in changes.hospital_ids.tolist()
+                      for row in self.rows_by_id.get(hospital_id, []))
+        if not rows:
+            self.table = EmergencyTable(self.table.rankings, self.table.candidates, snapshot_time)
+            return self.table
+
+        # Tanpa merge pandas: baris baru per id, default sama seperti
+        # merge_occupancy untuk hospital yang hilang atau nilai kosong
+        after = changes.after
+        occupancy = dict(zip(after['hospital_id'].tolist(),
+                             zip(after['occupancy_rate'].tolist(), after['status'].tolist(),
+                                 after['available_beds'].tolist(), after['wait_time_minutes'].tolist())))
+        new_records, new_sort_keys = [], []
+        for row in rows:
+            hospital = self.hospitals[row]
+            values = occupancy.get(hospital[0], (np.nan,) * 4)
+            defaults = (75.0, 'NORMAL', self.capacity[row] * 0.25, 30)
+            record, sort_key = self._entry(hospital, *[default if pd.isna(value) else value
+                                                       for value, default in zip(values, defaults)])
+            new_records.append(record)
+            new_sort_keys.append(sort_key)
+
+        rankings, ranking_keys = dict(self.table.rankings), dict(self._ranking_keys)
+        records, sort_keys = list(self._records), list(self._sort_keys)
+        copied = set()
+        changed_kabs = set()
+
+        def ranking(key):
+            if key not in copied:
+                rankings[key], ranking_keys[key] = list(rankings[key]), list(ranking_keys[key])
+                copied.add(key)
+            return rankings[key], ranking_keys[key]
+
+        for row, record, sort_key in zip(rows, new_records, new_sort_keys):
+            kab = record['kab']
+            changed_kabs.add(kab)
+            for kondisi, eligible in self.eligible.items():
+                if not eligible[row]:
+                    continue
+                for key in ((kab, kondisi), (None, kondisi)):
+                    entries, keys = ranking(key)
+                    if sort_keys[row] is not None:
+                        position = bisect.bisect_left(keys, sort_keys[row] + (row,))
+                        del entries[position], keys[position]
+                    if sort_key is not None:
+                        position = bisect.bisect_left(keys, sort_key + (row,))
+                        entries.insert(position, record)
+                        keys.insert(position, sort_key + (row,))
+            records[row], sort_keys[row] = record, sort_key
+
+        candidates = dict(self.table.candidates)
+        for (k, kondisi), picked in self.table.candidates.items():
+            # Kandidat bergantung pada ranking sendiri, tetangga, dan (jika
+            # kurang) daftar semua kabupaten
+            if (k in changed_kabs or changed_kabs.intersection(NEIGHBOURS.get(k, []))
+                    or len(picked) < self.n_candidates
+                    or any(entry['distance'] == FARTHER for entry in picked)):
+                candidates[(k, kondisi)] = self._candidates(rankings, k, kondisi)
+
+        self._records, self._sort_keys, self._ranking_keys = records, sort_keys, ranking_keys
+        self.table = EmergencyTable(rankings, candidates, snapshot_time)
+        return self.table
+
+    def _ranked(self, rankings, kab, kondisi, limit):
+        """(entry, jarak) berurutan: kabupaten sendiri, tetangga, lalu lainnya"""
+        local = rankings[(kab, kondisi)][:limit]
+        seen = {entry['hospital_id'] for entry in local}
+        for entry in local:
+            yield entry, LOCAL
+
+        nearby = [entry for neighbour in NEIGHBOURS.get(kab, [])
+                  for entry in rankings.get((neighbour, kondisi), [])[:limit]]
+        nearby.sort(key=lambda e: (-e['available_beds'], e['wait_time'], e['occupancy']))
+        seen.update(entry['hospital_id'] for entry in nearby)
+        for entry in nearby:
+            yield entry, NEARBY
+
+        for entry in rankings[(None, kondisi)]:
+            if entry['hospital_id'] not in seen:
+                yield entry, FARTHER
+
+    def _candidates(self, rankings, kab, kondisi, flagged=frozenset()):
+        """
+        Kandidat di kabupaten sendiri dulu, lalu tetangga, lalu lainnya.
+        Hospital yang sedang surge (flagged) diturunkan ke belakang, sama
+        seperti daftar rekomendasi.
+        """
+        # Paling banyak len(flagged) entry dilewati per sumber
+        limit = self.n_candidates + len(flagged)
+        picked, surging = [], []
+        for entry, distance in self._ranked(rankings, kab, kondisi, limit):
+            if entry['hospital_id'] in flagged:
+                if len(surging) < self.n_candidates:
+                    surging.append(dict(entry, distance=distance, surge=True))
+                continue
+            picked.append(dict(entry, distance=distance))
+            if len(picked) >= self.n_candidates:
+                break
+        return tuple(picked + surging[:self.n_candidates - len(picked)])
+
+    def lookup(self, kab, kondisi, flagged=None):
+        """
+        Kandidat hospital untuk pasien darurat (O(1) jika tidak ada
+        kandidat yang sedang surge)
+
+        Args:
+            flagged: set hospital_id yang sedang surge (optional) -
+                     diurutkan setelah hospital tanpa surge
+
+        Returns:
+            tuple dict (nama, alamat, kab, tipe, kelas, available_beds,
+            wait_time, occupancy, status, distance), terbaik lebih dulu;
+            kosong jika tidak ada hospital dengan bed
+        """
+        table = self.table
+        candidates = table.candidates.get((kab, kondisi), ())
+        if flagged and any(entry['hospital_id'] in flagged for entry in candidates):
+            return self._candidates(table.rankings, kab, kondisi, frozenset(flagged))
+        return candidates
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Index untuk semua hospital di manifest. Shard dibaca langsung (atau
+        dari serving state), tidak lewat cache LRU store.
+        """
+        regions = store.manifest['regions']
+        if store.shared is not None:
+            df_hospital = store.shared.frame('hospital', list(regions))
+        else:
+            df_hospital = pd.concat([
+                pd.read_csv(os.path.join(store.root, region['hospital']), sep=';')
+                for region in regions.values()
+            ], ignore_index=True)
+        return cls(df_hospital)
+
+
+if __name__ == "__main__":
+    import time
+
+    from occupancy_refresher import OCCUPANCY_PATH, load_occupancy_snapshot
+    from shard_store import ShardStore
+
+    store = ShardStore()
+    index = EmergencyIndex.from_store(store)
+
+    start = time.perf_counter()
+    snapshot = load_occupancy_snapshot(OCCUPANCY_PATH)
+    index.update(snapshot.df_occupancy, snapshot.snapshot_time)
+    print(f"✅ Emergency index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    kab = sys.argv[1] if len(sys.argv) > 1 else 'Kota Serang'
+    kondisi = sys.argv[2] if len(sys.argv) > 2 else '3'
+    start = time.perf_counter()
+    candidates = index.lookup(kab, kondisi)
+    elapsed = (time.perf_counter() - start) * 1e6
+    print(f"🚨 {kab} / kondisi {kondisi}: {len(candidates)} kandidat dalam {elapsed:.1f} µs")
+    for entry in candidates:
+        print(f"  {entry['nama']} ({entry['kab']}) - {entry['available_beds']} bed, "
+              f"~{entry['wait_time']} menit, {entry['occupancy']:.0f}%")
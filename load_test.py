@@ -0,0 +1,353 @@
+"""
+CrowdAID - Load Test
+Simulasi banyak session bersamaan terhadap jalur rekomendasi, untuk
+mengukur throughput, latency (p50/p95/p99) dan pertumbuhan memori
+
+Usage:
+    python load_test.py --sessions 20 --requests 50
+    python load_test.py --mode script --sessions 4 --requests 10
+    python load_test.py --sessions 20 --compare load_test_results/<run>.json
+
+Mode:
+    engine  - memanggil recommender.recommend langsung (seperti satu klik
+              di app, tanpa rendering)
+    script  - menjalankan app.py lewat Streamlit script runner (AppTest),
+              termasuk rendering, satu proses per session; jauh lebih
+              berat per request
+
+Output:
+    - load_test_results/<timestamp>_<mode>_<sessions>s.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from occupancy_refresher import OCCUPANCY_PATH, load_occupancy_snapshot
+from patient_mix import KONDISI_MIX, URGENCY_MIX
+from recommender import RegionViews, recommend
+from shard_store import ShardStore
+from surge_detector import SurgeDetector
+
+
+RESULTS_DIR = 'load_test_results'
+
+
+def current_rss_mb():
+    """RSS proses saat ini (Linux), fallback ke peak RSS"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS melaporkan byte, Linux kilobyte
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def request_mix(store, n, seed):
+    """
+    Daftar (kabupaten, kondisi, urgency); kabupaten dibobot dengan jumlah
+    hospital dari manifest
+    """
+    rng = random.Random(seed)
+    regions = store.manifest['regions'].values()
+    kab_weights = {}
+    for region in regions:
+        kab_weights[region['kab']] = kab_weights.get(region['kab'], 0) + region['hospitals']
+
+    kabupaten = rng.choices(list(kab_weights), weights=list(kab_weights.values()), k=n)
+    kondisi = rng.choices(list(KONDISI_MIX), weights=list(KONDISI_MIX.values()), k=n)
+    urgency = rng.choices(list(URGENCY_MIX), weights=list(URGENCY_MIX.values()), k=n)
+    return list(zip(kabupaten, kondisi, urgency))
+
+
+class EngineSession:
+    """Satu session yang memanggil jalur rekomendasi secara langsung"""
+
+    def __init__(self, store, df_occupancy, scorer, flagged, views):
+        self.store = store
+        self.df_occupancy = df_occupancy
+        self.scorer = scorer
+        self.flagged = flagged
+        self.views = views
+
+    def request(self, kabupaten, kondisi, urgency):
+        recommend(self.store, self.df_occupancy, kabupaten, kondisi, urgency,
+                  scorer=self.scorer, flagged=self.flagged, views=self.views)
+
+
+class ScriptSession:
+    """
+    Satu session Streamlit yang menjalankan app.py lewat AppTest
+
+    AppTest tidak thread-safe: setiap ScriptSession harus berjalan di
+    prosesnya sendiri (lihat _script_worker)
+    """
+
+    def __init__(self, app_path='app.py', timeout=60):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(app_path, default_timeout=timeout).run()
+
+    def request(self, kabupaten, kondisi, urgency):
+        self.app.selectbox[0].set_value(kabupaten)
+        self.app.selectbox[1].set_value(kondisi)
+        self.app.radio[0].set_value(urgency)
+        self.app.button[0].click().run()
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+
+def build_engine_resources(use_model=True):
+    """Resource yang sama dengan app_data, tanpa cache Streamlit"""
+    store = ShardStore()
+    snapshot = load_occupancy_snapshot(OCCUPANCY_PATH)
+    df_occupancy = snapshot.df_occupancy
+    views = RegionViews(store)
+    views.update(snapshot)
+
+    detector = SurgeDetector.load_or_build(store, alert_log_path=os.devnull)
+    detector.update(df_occupancy, log_alerts=False)
+
+    scorer = None
+    if use_model:
+        try:
+            from ml_predictor import CrowdAIDPredictor
+            from scoring import HospitalScorer
+            scorer = HospitalScorer(CrowdAIDPredictor())
+        except Exception as e:
+            print(f"⚠️ ML model tidak tersedia, ranking rule-based: {e}")
+    return store, df_occupancy, scorer, detector.flagged, views
+
+
+def drive(session, plan, warmup, barrier):
+    """
+    Jalankan plan satu session: warm-up, tunggu barrier, lalu request terukur
+
+    Returns:
+        (list latency detik untuk setiap request terukur, termasuk yang
+        gagal; list pesan error)
+    """
+    errors = []
+
+    def request(kabupaten, kondisi, urgency):
+        try:
+            session.request(kabupaten, kondisi, urgency)
+        except Exception as e:
+            errors.append(f"{kabupaten}/{kondisi}/{urgency}: {type(e).__name__}: {e}")
+
+    for kabupaten, kondisi, urgency in plan[:warmup]:
+        request(kabupaten, kondisi, urgency)
+    # Semua session mulai diukur bersamaan setelah warm-up
+    barrier.wait()
+    measured_from = len(errors)
+    latencies = []
+    for kabupaten, kondisi, urgency in plan[warmup:]:
+        start = time.perf_counter()
+        request(kabupaten, kondisi, urgency)
+        latencies.append(time.perf_counter() - start)
+    # Error warm-up tidak dihitung di hasil
+    return latencies, errors[measured_from:]
+
+
+def _script_worker(plan, warmup, barrier):
+    """
+    Satu ScriptSession di proses sendiri
+
+    Returns:
+        (latencies, errors, rss setelah setup, rss akhir, peak rss) proses ini
+    """
+    try:
+        session = ScriptSession()
+    except Exception:
+        # Session lain tidak menunggu barrier selamanya
+        barrier.abort()
+        raise
+    rss_ready = current_rss_mb()
+    latencies, errors = drive(session, plan, warmup, barrier)
+    return latencies, errors, rss_ready, current_rss_mb(), peak_rss_mb()
+
+
+def run(mode='engine', sessions=10, requests=50, seed=42, warmup=3, use_model=True):
+    """
+    Jalankan load test
+
+    Mode engine menjalankan session sebagai thread dalam satu proses; mode
+    script menjalankan setiap session di proses sendiri (AppTest tidak
+    thread-safe), sehingga memori dilaporkan sebagai jumlah semua worker.
+    Request yang gagal tetap masuk ke latency; throughput hanya menghitung
+    request yang berhasil.
+
+    Returns:
+        dict hasil (config, throughput, latency, memori, error)
+    """
+    rss_start = current_rss_mb()
+
+    if mode == 'engine':
+        store, df_occupancy, scorer, flagged, views = build_engine_resources(use_model)
+        mix_store = store
+    elif mode == 'script':
+        mix_store = ShardStore()
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    plans = [request_mix(mix_store, requests + warmup, seed + i) for i in range(sessions)]
+
+    if mode == 'engine':
+        session_objects = [EngineSession(store, df_occupancy, scorer, flagged, views)
+                           for _ in range(sessions)]
+        rss_ready = current_rss_mb()
+        barrier = threading.Barrier(sessions)
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            outcomes = list(pool.map(lambda i: drive(session_objects[i], plans[i], warmup, barrier),
+                                     range(sessions)))
+        wall = time.perf_counter() - wall_start
+        rss_end, peak_rss = current_rss_mb(), peak_rss_mb()
+    else:
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=sessions) as pool:
+            barrier = manager.Barrier(sessions)
+            wall_start = time.perf_counter()
+            futures = [pool.submit(_script_worker, plan, warmup, barrier) for plan in plans]
+            workers = [future.result() for future in futures]
+            # Termasuk start AppTest; pakai latency untuk waktu per request
+            wall = time.perf_counter() - wall_start
+        outcomes = [(latencies, errors) for latencies, errors, *_ in workers]
+        rss_ready = sum(worker[2] for worker in workers)
+        rss_end = sum(worker[3] for worker in workers)
+        peak_rss = sum(worker[4] for worker in workers)
+
+    samples = np.concatenate([np.asarray(latencies, dtype=float) for latencies, _ in outcomes]) * 1000
+    errors = [error for _, session_errors in outcomes for error in session_errors]
+    total = len(samples)
+    completed = total - len(errors)
+
+    def pct(q):
+        return round(float(np.percentile(samples, q)), 3) if total else None
+
+    return {
+        'config': {
+            'mode': mode,
+            'sessions': sessions,
+            'requests_per_session': requests,
+            'warmup': warmup,
+            'seed': seed,
+            'use_model': use_model
+        },
+        'environment': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'throughput_rps': round(completed / wall, 2) if wall > 0 else None,
+        'wall_seconds': round(wall, 3),
+        'requests': total,
+        'completed': completed,
+        'errors': len(errors),
+        'error_samples': errors[:10],
+        'latency_ms': {
+            'mean': round(float(samples.mean()), 3) if total else None,
+            'p50': pct(50),
+            'p95': pct(95),
+            'p99': pct(99),
+            'max': round(float(samples.max()), 3) if total else None
+        },
+        'memory_mb': {
+            'scope': 'process' if mode == 'engine' else 'sum of session processes',
+            'rss_start': round(rss_start, 1),
+            'rss_after_setup': round(rss_ready, 1),
+            'rss_end': round(rss_end, 1),
+            'growth_during_run': round(rss_end - rss_ready, 1),
+            'peak_rss': round(peak_rss, 1)
+        }
+    }
+
+
+def save_results(results, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    config = results['config']
+    name = f"{datetime.now():%Y%m%d_%H%M%S}_{config['mode']}_{config['sessions']}s.json"
+    path = os.path.join(results_dir, name)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def print_report(results, baseline=None):
+    config = results['config']
+    print("=" * 70)
+    print(f"CrowdAID LOAD TEST - mode={config['mode']} sessions={config['sessions']} "
+          f"requests/session={config['requests_per_session']}")
+    print("=" * 70)
+
+    rows = [
+        ('Throughput (req/s)', results['throughput_rps'], lambda r: r['throughput_rps']),
+        ('Latency p50 (ms)', results['latency_ms']['p50'], lambda r: r['latency_ms']['p50']),
+        ('Latency p95 (ms)', results['latency_ms']['p95'], lambda r: r['latency_ms']['p95']),
+        ('Latency p99 (ms)', results['latency_ms']['p99'], lambda r: r['latency_ms']['p99']),
+        ('Latency max (ms)', results['latency_ms']['max'], lambda r: r['latency_ms']['max']),
+        ('RSS growth (MB)', results['memory_mb']['growth_during_run'],
+         lambda r: r['memory_mb']['growth_during_run']),
+        ('Peak RSS (MB)', results['memory_mb']['peak_rss'], lambda r: r['memory_mb']['peak_rss']),
+    ]
+    for label, value, get in rows:
+        line = f"{label:22s}: {value}"
+        if baseline is not None:
+            previous = get(baseline)
+            if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+                line += f"   (baseline {previous}, {(value - previous) / previous * 100:+.1f}%)"
+        print(line)
+
+    print(f"{'Completed':22s}: {results['completed']}  errors: {results['errors']}")
+    if results['errors']:
+        print("⚠️ Latency termasuk request yang gagal; throughput hanya request yang berhasil")
+    for error in results['error_samples']:
+        print(f"  ❌ {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CrowdAID recommender load test")
+    parser.add_argument('--mode', choices=['engine', 'script'], default='engine')
+    parser.add_argument('--sessions', type=int, default=10, help="jumlah session bersamaan")
+    parser.add_argument('--requests', type=int, default=50, help="request per session")
+    parser.add_argument('--warmup', type=int, default=3, help="request warm-up per session (tidak diukur)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-model', action='store_true', help="ranking rule-based tanpa ML scorer")
+    parser.add_argument('--compare', help="file hasil sebelumnya sebagai baseline")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run(mode=args.mode, sessions=args.sessions, requests=args.requests, seed=args.seed,
+                  warmup=args.warmup, use_model=not args.no_model)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if not args.no_save:
+        print(f"\n✅ Saved: {save_results(results)}")
+    # Run dengan error dianggap gagal (exit code != 0)
+    return 1 if results['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,122 @@ Menggunakan trained Random Forest model untuk prediksi
 """
 
 import pandas as pd
+import numpy as np
 import pickle
 import json
 
+# Label fitur model untuk penjelasan di UI
+FEATURE_LABELS = {
+    'hospital_type_encoded': 'Jenis RS',
+    'hospital_class_encoded': 'Kelas RS',
+    'capacity': 'Kapasitas Bed',
+    'services': 'Jumlah Layanan',
+    'staff': 'Tenaga Kerja',
+    'condition_encoded': 'Kondisi Pasien'
+}
+
+# Kontribusi di bawah ini (dalam probability) tidak ditampilkan
+MIN_CONTRIBUTION = 0.005
+
+
+class ForestExplainer:
+    """
+    Kontribusi per fitur untuk prediksi Random Forest (path-based, seperti
+    treeinterpreter): probability = bias + jumlah kontribusi fitur
+
+    Setiap split di jalur root -> leaf mengubah probability node sebesar
+    value(child) - value(parent), dan perubahan itu diatribusikan ke fitur
+    split parent. Kontribusi kumulatif dari root dihitung sekali untuk
+    setiap node di semua tree, sehingga penjelasan satu batch hanya
+    model.apply + indexing array.
+    """
+
+    def __init__(self, model, feature_columns, positive_class=1):
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        n_features = len(self.feature_columns)
+        class_index = list(model.classes_).index(positive_class)
+
+        cumulative, offsets, roots = [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            # tree_.value bisa berisi jumlah sampel per kelas; normalisasi
+            value = tree.value[:, 0, :]
+            proba = value[:, class_index] / value.sum(axis=1)
+
+            parent = np.full(tree.node_count, -1)
+            is_split = tree.children_left >= 0
+            parent[tree.children_left[is_split]] = np.flatnonzero(is_split)
+            parent[tree.children_right[is_split]] = np.flatnonzero(is_split)
+
+            depth = np.zeros(tree.node_count, dtype=np.int64)
+            contributions = np.zeros((tree.node_count, n_features))
+            # Node id parent selalu lebih kecil dari child; proses per level
+            # sehingga kontribusi parent sudah final saat child dihitung
+            for node in range(1, tree.node_count):
+                depth[node] = depth[parent[node]] + 1
+            for level in range(1, depth.max() + 1):
+                nodes = np.flatnonzero(depth == level)
+                parents = parent[nodes]
+                contributions[nodes] = contributions[parents]
+                contributions[nodes, tree.feature[parents]] += proba[nodes] - proba[parents]
+
+            cumulative.append(contributions)
+            offsets.append(offset)
+            roots.append(proba[0])
+            offset += tree.node_count
+
+        self.node_contributions = np.concatenate(cumulative)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.bias = float(np.mean(roots))
+
+    @classmethod
+    def from_arrays(cls, model, feature_columns, node_contributions, offsets, bias):
+        """Explainer dari array yang sudah dihitung (mis. serving_state)"""
+        explainer = cls.__new__(cls)
+        explainer.model = model
+        explainer.feature_columns = list(feature_columns)
+        explainer.node_contributions = node_contributions
+        explainer.offsets = offsets
+        explainer.bias = float(bias)
+        return explainer
+
+    def contributions(self, features):
+        """
+        Args:
+            features: DataFrame fitur model (kolom feature_columns)
+
+        Returns:
+            array (n, n_features) - kontribusi setiap fitur ke probability
+        """
+        if len(features) == 0:
+            return np.zeros((0, len(self.feature_columns)))
+        leaves = self.model.apply(features) + self.offsets
+        return self.node_contributions[leaves].mean(axis=1)
+
+
+def top_factors(contributions, feature_columns, n=3):
+    """
+    Ringkasan teks faktor terbesar per baris, mis.
+    'Kelas RS +12%, Jumlah Layanan +5%'; None untuk baris NaN
+
+    Args:
+        contributions: array (rows, n_features)
+    """
+    contributions = np.asarray(contributions, dtype=float)
+    labels = [FEATURE_LABELS.get(column, column) for column in feature_columns]
+    order = np.argsort(-np.abs(np.nan_to_num(contributions)), axis=1, kind='stable')[:, :n]
+    factors = []
+    for row, top in zip(contributions, order):
+        if np.isnan(row).any():
+            factors.append(None)
+            continue
+        parts = [f"{labels[i]} {row[i] * 100:+.0f}%" for i in top if abs(row[i]) >= MIN_CONTRIBUTION]
+        factors.append(', '.join(parts) if parts else None)
+    return factors
+
+
 class CrowdAIDPredictor:
     """
     Predictor class untuk CrowdAID menggunakan trained ML model
@@ -30,9 +143,25 @@ class CrowdAIDPredictor:
         with open(metadata_path, 'r') as f:
             self.metadata = json.load(f)
         
+        # Kontribusi per node dihitung sekali untuk penjelasan per request
+        self.explainer = ForestExplainer(self.model, self.metadata['feature_columns'])
+        
         print("✅ Model loaded successfully!")
         print(f"   Model accuracy: {self.metadata['accuracy_train']*100:.2f}%")
     
+    @classmethod
+    def from_parts(cls, model, encoders, metadata, explainer):
+        """
+        Predictor dari model/encoders yang sudah di-load (tanpa pickle),
+        mis. forest yang di-attach dari serving_state
+        """
+        predictor = cls.__new__(cls)
+        predictor.model = model
+        predictor.encoders = encoders
+        predictor.metadata = metadata
+        predictor.explainer = explainer
+        return predictor
+    
     def predict_suitability(self, hospital_type, hospital_class, 
                           capacity, services, staff, condition):
         """
@@ -83,7 +212,104 @@ class CrowdAIDPredictor:
             'score': score
         }
     
-    def get_recommendations(self, hospitals_df, condition, location=None):
+    def _encode(self, encoder_name, values):
+        """
+        Encode array of labels, -1 untuk label yang tidak dikenal
+        """
+        classes = self.encoders[encoder_name].classes_
+        values = np.asarray(values, dtype=object)
+        codes = np.searchsorted(classes, values.astype(str))
+        codes = np.clip(codes, 0, len(classes) - 1)
+        return np.where(classes[codes] == values, codes, -1)
+    
+    def _feature_frame(self, hospitals_df, condition):
+        """
+        Fitur model untuk hospital yang dikenal encoder
+        
+        Returns:
+            (features DataFrame atau None, mask boolean hospital yang dikenal)
+        """
+        n = len(hospitals_df)
+        if n == 0:
+            return None, np.zeros(0, dtype=bool)
+        
+        type_encoded = self._encode('hospital_type', hospitals_df['jenis'])
+        class_encoded = self._encode('hospital_class', hospitals_df['kelas'])
+        condition_encoded = self._encode('condition', [condition])[0]
+        known = (type_encoded >= 0) & (class_encoded >= 0)
+        if condition_encoded < 0 or not known.any():
+            return None, np.zeros(n, dtype=bool)
+        
+        features = pd.DataFrame({
+            'hospital_type_encoded': type_encoded[known],
+            'hospital_class_encoded': class_encoded[known],
+            'capacity': hospitals_df['total_tempat_tidur'].to_numpy()[known],
+            'services': hospitals_df['total_layanan'].to_numpy()[known],
+            'staff': hospitals_df['total_tenaga_kerja'].to_numpy()[known],
+            'condition_encoded': condition_encoded
+        }, columns=self.metadata['feature_columns'])
+        return features, known
+    
+    def predict_suitability_batch(self, hospitals_df, condition):
+        """
+        Vectorized predict_suitability untuk banyak hospital sekaligus
+        
+        Args:
+            hospitals_df: DataFrame dengan kolom jenis, kelas,
+                          total_tempat_tidur, total_layanan, total_tenaga_kerja
+            condition: str - kondisi pasien
+        
+        Returns:
+            numpy array probability (0-1), 0 untuk hospital/kondisi
+            yang tidak dikenal encoder
+        """
+        probability = np.zeros(len(hospitals_df))
+        features, known = self._feature_frame(hospitals_df, condition)
+        if features is not None:
+            probability[known] = self.model.predict_proba(features)[:, 1]
+        return probability
+    
+    def explain_suitability_batch(self, hospitals_df, condition):
+        """
+        Kontribusi setiap fitur ke probability suitability (lihat
+        ForestExplainer); bias + jumlah kontribusi = probability
+        
+        Returns:
+            DataFrame (index = hospital id, columns = feature_columns),
+            NaN untuk hospital/kondisi yang tidak dikenal encoder
+        """
+        columns = self.metadata['feature_columns']
+        contributions = np.full((len(hospitals_df), len(columns)), np.nan)
+        features, known = self._feature_frame(hospitals_df, condition)
+        if features is not None:
+            contributions[known] = self.explainer.contributions(features)
+        return pd.DataFrame(contributions, index=hospitals_df['id'].to_numpy(), columns=columns)
+    
+    def suitability_matrix(self, hospitals_df):
+        """
+        Probability suitability untuk semua kondisi yang dikenal model
+        
+        Returns:
+            DataFrame (index = hospital id, columns = kondisi)
+        """
+        return pd.DataFrame({
+            condition: self.predict_suitability_batch(hospitals_df, condition)
+            for condition in self.metadata['conditions']
+        }, index=hospitals_df['id'].to_numpy())
+    
+    def contribution_matrix(self, hospitals_df):
+        """
+        Kontribusi fitur untuk semua kondisi yang dikenal model
+        
+        Returns:
+            DataFrame (index = hospital id, columns = (kondisi, fitur))
+        """
+        return pd.concat({
+            condition: self.explain_suitability_batch(hospitals_df, condition)
+            for condition in self.metadata['conditions']
+        }, axis=1)
+    
+    def get_recommendations(self, hospitals_df, condition, location=None, explain=False):
         """
         Get ranked recommendations untuk kondisi tertentu
         
@@ -91,48 +317,45 @@ class CrowdAIDPredictor:
             hospitals_df: DataFrame dengan hospital data
             condition: str - kondisi pasien
             location: str - kabupaten/kota (optional)
+            explain: bool - tambahkan kolom top_factors (faktor fitur
+                     terbesar untuk setiap rekomendasi)
         
         Returns:
             DataFrame dengan ranked recommendations
         """
-        recommendations = []
-        
         # Filter by location if specified
         if location:
             hospitals_df = hospitals_df[hospitals_df['kab'] == location]
         
-        # Predict for each hospital
-        for idx, row in hospitals_df.iterrows():
-            result = self.predict_suitability(
-                hospital_type=row['jenis'],
-                hospital_class=row['kelas'],
-                capacity=row['total_tempat_tidur'],
-                services=row['total_layanan'],
-                staff=row['total_tenaga_kerja'],
-                condition=condition
-            )
-            
-            if result['is_suitable']:
-                recommendations.append({
-                    'nama': row['nama'],
-                    'alamat': row['alamat'],
-                    'jenis': row['jenis'],
-                    'kelas': row['kelas'],
-                    'kapasitas': row['total_tempat_tidur'],
-                    'layanan': row['total_layanan'],
-                    'staff': row['total_tenaga_kerja'],
-                    'ml_score': result['score'],
-                    'probability': result['probability'],
-                    'confidence': result['confidence']
-                })
-        
-        # Convert to DataFrame and sort by score
-        if recommendations:
-            df_recommendations = pd.DataFrame(recommendations)
-            df_recommendations = df_recommendations.sort_values('ml_score', ascending=False)
-            return df_recommendations
-        else:
+        probability = self.predict_suitability_batch(hospitals_df, condition)
+        suitable = probability >= 0.5
+        if not suitable.any():
             return pd.DataFrame()
+        
+        rows = hospitals_df[suitable]
+        probability = probability[suitable]
+        confidence = np.where(
+            (probability >= 0.8) | (probability <= 0.2), 'High',
+            np.where((probability >= 0.6) | (probability <= 0.4), 'Medium', 'Low')
+        )
+        
+        df_recommendations = pd.DataFrame({
+            'nama': rows['nama'].to_numpy(),
+            'alamat': rows['alamat'].to_numpy(),
+            'jenis': rows['jenis'].to_numpy(),
+            'kelas': rows['kelas'].to_numpy(),
+            'kapasitas': rows['total_tempat_tidur'].to_numpy(),
+            'layanan': rows['total_layanan'].to_numpy(),
+            'staff': rows['total_tenaga_kerja'].to_numpy(),
+            'ml_score': (probability * 100).astype(int),
+            'probability': probability,
+            'confidence': confidence
+        })
+        if explain:
+            contributions = self.explain_suitability_batch(rows, condition).to_numpy()
+            df_recommendations['top_factors'] = top_factors(contributions, self.metadata['feature_columns'])
+        df_recommendations = df_recommendations.sort_values('ml_score', ascending=False, kind='mergesort')
+        return df_recommendations
     
     def get_feature_importance(self):
         """
@@ -0,0 +1,324 @@
+"""
+CrowdAID - Occupancy Refresher
+Background thread yang memantau Hospital_Occupancy_Current.csv dan menukar
+snapshot occupancy secara atomik, sehingga request tidak pernah menunggu I/O
+"""
+
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+OCCUPANCY_PATH = 'Hospital_Occupancy_Current.csv'
+
+# Interval antar snapshot (data di-update setiap 6 jam)
+SNAPSHOT_HOURS = 6
+
+# Kolom yang berubah setiap export tanpa mengubah isi data hospital
+DIFF_IGNORE_COLUMNS = ('timestamp',)
+
+
+class OccupancyChanges:
+    """
+    Change set antara dua snapshot occupancy berurutan (per hospital_id)
+
+    Attributes:
+        base_loaded_at: datetime - loaded_at snapshot sebelumnya; consumer
+                        hanya boleh menerapkan delta ini di atas snapshot itu
+        before: DataFrame baris lama untuk hospital yang berubah atau hilang
+        after: DataFrame baris baru untuk hospital yang berubah atau baru
+    """
+
+    __slots__ = ('base_loaded_at', 'before', 'after')
+
+    def __init__(self, base_loaded_at, before, after):
+        object.__setattr__(self, 'base_loaded_at', base_loaded_at)
+        object.__setattr__(self, 'before', before)
+        object.__setattr__(self, 'after', after)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("OccupancyChanges is immutable")
+
+    def __len__(self):
+        return len(self.hospital_ids)
+
+    @property
+    def hospital_ids(self):
+        """Semua hospital_id yang terdampak (berubah, baru, atau hilang)"""
+        return np.union1d(self.before['hospital_id'].to_numpy(), self.after['hospital_id'].to_numpy())
+
+
+def diff_occupancy(df_previous, df_current, base_loaded_at=None):
+    """
+    Bandingkan dua DataFrame occupancy per hospital_id
+
+    Returns:
+        OccupancyChanges, atau None jika diff tidak bisa dipakai (kolom
+        berbeda atau hospital_id duplikat); consumer lalu membangun ulang
+        semua derived state
+    """
+    if list(df_previous.columns) != list(df_current.columns) or 'hospital_id' not in df_current.columns:
+        return None
+    if df_previous['hospital_id'].duplicated().any() or df_current['hospital_id'].duplicated().any():
+        return None
+
+    previous_ids = df_previous['hospital_id'].to_numpy()
+    current_ids = df_current['hospital_id'].to_numpy()
+    # Posisi baris snapshot lama untuk setiap baris baru, -1 untuk hospital baru
+    previous_pos = pd.Index(previous_ids).get_indexer(current_ids)
+    common = previous_pos >= 0
+
+    differs = ~common
+    for column in df_current.columns:
+        if column in DIFF_IGNORE_COLUMNS:
+            continue
+        old = df_previous[column].to_numpy()[previous_pos[common]]
+        new = df_current[column].to_numpy()[common]
+        # NaN di kedua sisi dianggap sama
+        differs[common] |= ~((old == new) | (pd.isna(old) & pd.isna(new)))
+
+    removed = ~np.isin(previous_ids, current_ids)
+    before_pos = np.concatenate([previous_pos[common & differs], np.flatnonzero(removed)])
+    before = df_previous.iloc[before_pos].reset_index(drop=True)
+    after = df_current[differs].reset_index(drop=True)
+    return OccupancyChanges(base_loaded_at, before, after)
+
+
+class OccupancySnapshot:
+    """
+    Immutable snapshot dari data occupancy
+
+    Attributes:
+        df_occupancy: DataFrame occupancy (jangan dimodifikasi in-place)
+        snapshot_time: datetime - timestamp data (bukan waktu load)
+        mtime: float - mtime file sumber, None jika data dummy
+        loaded_at: datetime - kapan snapshot ini di-parse
+        changes: OccupancyChanges terhadap snapshot sebelumnya, None jika
+                 derived state harus dibangun ulang penuh
+    """
+
+    __slots__ = ('df_occupancy', 'snapshot_time', 'mtime', 'loaded_at', 'changes')
+
+    def __init__(self, df_occupancy, snapshot_time, mtime=None, loaded_at=None, changes=None):
+        object.__setattr__(self, 'df_occupancy', df_occupancy)
+        object.__setattr__(self, 'snapshot_time', snapshot_time)
+        object.__setattr__(self, 'mtime', mtime)
+        object.__setattr__(self, 'loaded_at', loaded_at or datetime.now())
+        object.__setattr__(self, 'changes', changes)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("OccupancySnapshot is immutable")
+
+    @property
+    def is_dummy(self):
+        return self.mtime is None
+
+
+def dummy_occupancy(df_hospital=None):
+    """
+    Data occupancy default jika file occupancy tidak tersedia
+
+    Tanpa df_hospital dikembalikan frame kosong; merge_occupancy mengisi
+    default yang sama (75%, NORMAL, 25% bed, 30 menit) untuk setiap hospital.
+    """
+    if df_hospital is None:
+        return pd.DataFrame(columns=['hospital_id', 'hospital_name', 'occupancy_rate', 'status',
+                                     'available_beds', 'wait_time_minutes'])
+    return pd.DataFrame({
+        'hospital_id': df_hospital['id'],
+        'hospital_name': df_hospital['nama'],
+        'occupancy_rate': [75.0] * len(df_hospital),
+        'status': ['NORMAL'] * len(df_hospital),
+        'available_beds': df_hospital['total_tempat_tidur'] * 0.25,
+        'wait_time_minutes': [30] * len(df_hospital)
+    })
+
+
+def load_occupancy_snapshot(path, df_hospital=None, previous=None):
+    """
+    Parse file occupancy menjadi OccupancySnapshot
+
+    Jika file tidak ada, kembalikan snapshot dummy dengan waktu sekarang.
+    Error parsing lainnya di-raise agar caller bisa mempertahankan state lama.
+    Jika `previous` (snapshot non-dummy) diberikan, snapshot baru membawa
+    change set terhadapnya.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return OccupancySnapshot(dummy_occupancy(df_hospital), datetime.now())
+    df_occupancy = pd.read_csv(path)
+
+    snapshot_time = None
+    if 'timestamp' in df_occupancy.columns:
+        snapshot_time = pd.to_datetime(df_occupancy['timestamp'], errors='coerce').max()
+    if snapshot_time is None or pd.isna(snapshot_time):
+        snapshot_time = datetime.fromtimestamp(mtime)
+    else:
+        snapshot_time = snapshot_time.to_pydatetime()
+
+    changes = None
+    if previous is not None and not previous.is_dummy:
+        changes = diff_occupancy(previous.df_occupancy, df_occupancy, previous.loaded_at)
+    return OccupancySnapshot(df_occupancy, snapshot_time, mtime=mtime, changes=changes)
+
+
+class OccupancySummary:
+    """
+    Ringkasan occupancy untuk sidebar (rata-rata occupancy dan jumlah
+    hospital per status), diperbarui dari change set snapshot
+
+    Pembaca memakai `totals`: dict baru yang di-swap setiap update (jangan
+    dimodifikasi). Tanpa change set yang cocok ringkasan dihitung ulang
+    penuh, sama seperti perhitungan langsung dari df_occupancy.
+    """
+
+    def __init__(self):
+        self._rates = {}
+        self._statuses = {}
+        self._rate_sum = 0.0
+        self._rate_count = 0
+        self._status_counts = {}
+        self._loaded_at = None
+        self.totals = self._totals(None)
+
+    def update(self, snapshot):
+        changes = snapshot.changes
+        if changes is None or changes.base_loaded_at != self._loaded_at:
+            self._rebuild(snapshot.df_occupancy)
+        else:
+            for hospital_id in changes.before['hospital_id'].tolist():
+                self._remove(hospital_id)
+            after = changes.after
+            for row in zip(after['hospital_id'].tolist(), after['occupancy_rate'].tolist(),
+                           after['status'].tolist()):
+                self._add(*row)
+        self._loaded_at = snapshot.loaded_at
+        self.totals = self._totals(snapshot.snapshot_time)
+        return self.totals
+
+    def _rebuild(self, df_occupancy):
+        self._rates, self._statuses, self._status_counts = {}, {}, {}
+        self._rate_sum, self._rate_count = 0.0, 0
+        if df_occupancy['hospital_id'].duplicated().any():
+            # Baris duplikat: hitung per baris (tidak bisa di-diff per id)
+            rates = df_occupancy['occupancy_rate']
+            self._rate_sum, self._rate_count = float(rates.sum()), int(rates.count())
+            self._status_counts = df_occupancy['status'].value_counts().to_dict()
+            return
+        for row in zip(df_occupancy['hospital_id'].tolist(), df_occupancy['occupancy_rate'].tolist(),
+                       df_occupancy['status'].tolist()):
+            self._add(*row)
+
+    def _add(self, hospital_id, rate, status):
+        self._rates[hospital_id] = rate
+        self._statuses[hospital_id] = status
+        if not pd.isna(rate):
+            self._rate_sum += rate
+            self._rate_count += 1
+        if not pd.isna(status):
+            self._status_counts[status] = self._status_counts.get(status, 0) + 1
+
+    def _remove(self, hospital_id):
+        rate = self._rates.pop(hospital_id, np.nan)
+        status = self._statuses.pop(hospital_id, np.nan)
+        if not pd.isna(rate):
+            self._rate_sum -= rate
+            self._rate_count -= 1
+        if not pd.isna(status):
+            self._status_counts[status] -= 1
+
+    def _totals(self, snapshot_time):
+        return {
+            'avg_occupancy': self._rate_sum / self._rate_count if self._rate_count else 75.0,
+            'status_counts': {status: n for status, n in self._status_counts.items() if n > 0},
+            'snapshot_time': snapshot_time
+        }
+
+
+class OccupancyRefresher(threading.Thread):
+    """
+    Daemon thread yang polling mtime file occupancy dan mengganti
+    snapshot saat file berubah
+
+    Snapshot awal di-load secara sinkron di constructor; setelah itu semua
+    parsing dilakukan di thread ini. Pembaca cukup mengakses `.state`,
+    yang berupa satu reference read (atomik) ke snapshot immutable.
+
+    Listener (lihat add_listener) dipanggil di thread ini setelah setiap
+    swap untuk memperbarui derived state di luar request path; snapshot
+    membawa change set (snapshot.changes) sehingga listener cukup
+    memperbarui hospital yang berubah.
+    """
+
+    def __init__(self, df_hospital=None, path=OCCUPANCY_PATH, poll_interval=5.0):
+        super().__init__(name='OccupancyRefresher', daemon=True)
+        self.df_hospital = df_hospital
+        self.path = path
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._listeners = []
+        # Swap + notify dan registrasi listener berjalan berurutan, sehingga
+        # listener tidak pernah dipanggil bersamaan atau dengan snapshot lama
+        self._lock = threading.Lock()
+        try:
+            self._state = load_occupancy_snapshot(path, df_hospital)
+        except Exception:
+            self._state = OccupancySnapshot(dummy_occupancy(df_hospital), datetime.now())
+
+    @property
+    def state(self):
+        """Snapshot occupancy terbaru"""
+        return self._state
+
+    def add_listener(self, callback):
+        """
+        Daftarkan callback(snapshot) yang dipanggil setelah snapshot baru
+        di-swap. Callback langsung dipanggil sekali dengan state saat ini.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+            callback(self._state)
+
+    def _notify(self, state):
+        for callback in self._listeners:
+            try:
+                callback(state)
+            except Exception as e:
+                print(f"⚠️ Listener occupancy gagal: {e}")
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def refresh(self):
+        """
+        Reload snapshot jika file berubah. Returns True jika state diganti.
+        """
+        mtime = self._current_mtime()
+        if mtime is None or mtime == self._state.mtime:
+            return False
+
+        try:
+            new_state = load_occupancy_snapshot(self.path, self.df_hospital, previous=self._state)
+        except Exception as e:
+            # File mungkin sedang ditulis; coba lagi pada poll berikutnya
+            print(f"⚠️ Gagal reload occupancy: {e}")
+            return False
+
+        with self._lock:
+            self._state = new_state
+            self._notify(new_state)
+        return True
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.refresh()
+
+    def stop(self):
+        self._stop_event.set()
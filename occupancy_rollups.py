@@ -0,0 +1,405 @@
+"""
+CrowdAID - Occupancy Rollups
+Agregat occupancy yang di-materialise (per jam, per hari, per jam-dalam-hari)
+untuk setiap hospital, kabupaten dan kelas RS. Snapshot baru ditambahkan
+secara incremental sehingga dashboard tidak perlu membaca raw history.
+
+Usage:
+    python occupancy_rollups.py      # build/refresh occupancy_rollups.pkl
+"""
+
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
+
+from occupancy_refresher import SNAPSHOT_HOURS
+from shard_store import ShardStore
+
+
+CACHE_PATH = 'occupancy_rollups.pkl'
+# Versi format cache; cache versi lain dibangun ulang
+CACHE_VERSION = 2
+# Journal snapshot di-compact ke cache setelah melewati ukuran ini
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+# Histogram occupancy 0-100% dengan resolusi 1% untuk persentil
+HIST_BINS = 101
+
+DIMENSIONS = {
+    'hospital': 'hospital_id',
+    'kab': 'location',
+    'kelas': 'hospital_class'
+}
+
+GRAINS = ['hour', 'day', 'hour_of_day']
+
+# Panjang satu bucket per grain (jam); satu snapshot PENUH dihitung sebagai
+# interval snapshot, tapi tidak lebih dari panjang bucket-nya
+GRAIN_HOURS = {'hour': 1, 'day': 24, 'hour_of_day': 1}
+
+# Per hospital per jam hanya ada satu snapshot per grup: tanpa histogram
+# (p90 diambil dari grain day/hour_of_day)
+NO_HIST = {('hospital', 'hour')}
+
+# Kolom yang dipakai ingest; hanya kolom ini yang ditulis ke journal
+JOURNAL_COLUMNS = ['timestamp', 'occupancy_rate', 'status', *DIMENSIONS.values()]
+
+
+def _file_lock(path):
+    """File lock antar proses untuk cache + journal; dipakai dengan `with`"""
+    lock = open(f"{path}.lock", 'w')
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def _key_column(values):
+    """Array key untuk pickle: numerik/datetime apa adanya, selain itu object"""
+    array = np.array(values)
+    return array if array.dtype.kind in 'biuM' else np.array(values, dtype=object)
+
+
+def _bucket(timestamps, grain):
+    if grain == 'hour':
+        return timestamps.dt.floor('H')
+    if grain == 'day':
+        return timestamps.dt.floor('D')
+    if grain == 'hour_of_day':
+        return timestamps.dt.hour
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+class _Rollup:
+    """
+    Agregat additive untuk satu (dimensi, grain): count, sum, jumlah
+    snapshot PENUH dan (opsional) histogram occupancy per grup
+
+    Histogram disimpan sparse: hanya sel (grup, bin) yang terisi, sebagai
+    cell id terurut (grup * HIST_BINS + bin) dan count-nya.
+    """
+
+    def __init__(self, with_hist=True):
+        self.with_hist = with_hist
+        self.index = {}
+        self.keys = []
+        self.count = np.zeros(0, dtype=np.int32)
+        self.total = np.zeros(0)
+        self.penuh = np.zeros(0, dtype=np.int32)
+        self.hist_cells = np.zeros(0, dtype=np.int64)
+        self.hist_counts = np.zeros(0, dtype=np.int32)
+
+    def __getstate__(self):
+        # Index dibangun ulang saat load; key disimpan per kolom dan array
+        # tanpa kapasitas cadangan
+        n = len(self.keys)
+        keys, buckets = zip(*self.keys) if n else ((), ())
+        state = self.__dict__.copy()
+        del state['index']
+        state['keys'] = (_key_column(keys), _key_column(buckets))
+        for name in ('count', 'total', 'penuh'):
+            state[name] = state[name][:n].copy()
+        return state
+
+    def __setstate__(self, state):
+        keys, buckets = state.pop('keys')
+        self.__dict__.update(state)
+        self.keys = list(zip(keys, buckets))
+        self.index = {group: row for row, group in enumerate(self.keys)}
+
+    def _grow(self, size):
+        capacity = len(self.count)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 64)
+        pad = new_capacity - capacity
+        self.count = np.concatenate([self.count, np.zeros(pad, dtype=np.int32)])
+        self.total = np.concatenate([self.total, np.zeros(pad)])
+        self.penuh = np.concatenate([self.penuh, np.zeros(pad, dtype=np.int32)])
+
+    def add(self, keys, buckets, occupancy, is_penuh):
+        """Tambahkan baris snapshot (array sejajar)"""
+        groups = list(zip(keys, buckets))
+        rows = np.empty(len(groups), dtype=np.int64)
+        for i, group in enumerate(groups):
+            row = self.index.get(group)
+            if row is None:
+                row = len(self.keys)
+                self.index[group] = row
+                self.keys.append(group)
+            rows[i] = row
+        self._grow(len(self.keys))
+
+        np.add.at(self.count, rows, 1)
+        np.add.at(self.total, rows, occupancy)
+        np.add.at(self.penuh, rows, is_penuh.astype(np.int32))
+        if not self.with_hist:
+            return
+
+        bins = np.clip(np.rint(occupancy), 0, HIST_BINS - 1).astype(np.int64)
+        cells, counts = np.unique(rows * HIST_BINS + bins, return_counts=True)
+        position = np.searchsorted(self.hist_cells, cells)
+        found = position < len(self.hist_cells)
+        found[found] = self.hist_cells[position[found]] == cells[found]
+        self.hist_counts[position[found]] += counts[found].astype(np.int32)
+        self.hist_cells = np.insert(self.hist_cells, position[~found], cells[~found])
+        self.hist_counts = np.insert(self.hist_counts, position[~found], counts[~found].astype(np.int32))
+
+    def _p90(self, count):
+        """Persentil ke-90 per grup dari histogram (resolusi 1%), NaN tanpa histogram"""
+        p90 = np.full(len(count), np.nan)
+        if not self.with_hist or len(self.hist_cells) == 0:
+            return p90
+        rows = self.hist_cells // HIST_BINS
+        bins = self.hist_cells % HIST_BINS
+        cumulative = np.cumsum(self.hist_counts, dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        lengths = np.diff(np.r_[starts, len(rows)])
+        # Cumulative count di dalam grup sendiri
+        within = cumulative - np.repeat(cumulative[starts] - self.hist_counts[starts], lengths)
+        reached = within >= np.ceil(0.9 * count[rows])
+        first_rows, first = np.unique(rows[reached], return_index=True)
+        p90[first_rows] = bins[reached][first]
+        return p90
+
+    def frame(self, key_name, bucket_name):
+        n = len(self.keys)
+        count = self.count[:n]
+        keys, buckets = zip(*self.keys) if n else ((), ())
+        hours_per_snapshot = min(SNAPSHOT_HOURS, GRAIN_HOURS[bucket_name])
+        return pd.DataFrame({
+            key_name: list(keys),
+            bucket_name: list(buckets),
+            'snapshots': count.astype(np.int64),
+            'mean_occupancy': self.total[:n] / np.maximum(count, 1),
+            'p90_occupancy': self._p90(count),
+            'penuh_snapshots': self.penuh[:n].astype(np.int64),
+            'penuh_hours': self.penuh[:n].astype(np.int64) * hours_per_snapshot,
+            'penuh_share': self.penuh[:n] / np.maximum(count, 1)
+        }).sort_values([key_name, bucket_name], kind='mergesort').reset_index(drop=True)
+
+
+class OccupancyRollups:
+    """
+    Materialised rollups per (dimensi, grain)
+
+    Dimensi: hospital, kab, kelas. Grain: hour, day, hour_of_day.
+    `watermark` menyimpan timestamp terakhir yang sudah di-ingest sehingga
+    snapshot yang sama tidak dihitung dua kali.
+
+    Persistensi: cache pickle penuh ditulis saat build/compact; snapshot
+    baru hanya di-append ke journal (append_journal) dan di-replay saat
+    load. Cache dan journal hanya diubah di bawah file lock.
+    """
+
+    def __init__(self):
+        self.rollups = {(dim, grain): _Rollup(with_hist=(dim, grain) not in NO_HIST)
+                        for dim in DIMENSIONS for grain in GRAINS}
+        self.watermark = None
+        self.history_mtime = None
+        self.version = CACHE_VERSION
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_frames'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def ingest(self, df_occupancy):
+        """
+        Tambahkan baris occupancy yang lebih baru dari watermark
+
+        Returns:
+            int - jumlah baris yang di-ingest
+        """
+        with self._lock:
+            # Cek watermark di dalam lock: snapshot yang sama tidak dihitung dua kali
+            count, latest = self._ingest(df_occupancy, self.watermark)
+            if count:
+                self.watermark = latest
+        return count
+
+    def ingest_history(self, frames):
+        """
+        Ingest history yang dipartisi (mis. satu shard per region); setiap
+        frame dibandingkan dengan watermark awal, bukan watermark frame lain
+
+        Returns:
+            int - jumlah baris yang di-ingest
+        """
+        total = 0
+        with self._lock:
+            since = self.watermark
+            for df_history in frames:
+                count, latest = self._ingest(df_history, since)
+                if count:
+                    total += count
+                    if self.watermark is None or latest > self.watermark:
+                        self.watermark = latest
+        return total
+
+    def _ingest(self, df_occupancy, since):
+        # Caller memegang self._lock
+        timestamps = pd.to_datetime(df_occupancy['timestamp'], errors='coerce')
+        mask = timestamps.notna().to_numpy()
+        if since is not None:
+            mask &= (timestamps > since).to_numpy()
+        if not mask.any():
+            return 0, None
+
+        rows = df_occupancy[mask]
+        timestamps = timestamps[mask]
+        occupancy = rows['occupancy_rate'].to_numpy(dtype=float)
+        is_penuh = (rows['status'] == 'PENUH').to_numpy()
+
+        for (dim, grain), rollup in self.rollups.items():
+            rollup.add(rows[DIMENSIONS[dim]].to_numpy(), _bucket(timestamps, grain).to_numpy(),
+                       occupancy, is_penuh)
+        self._frames = {}
+        return int(mask.sum()), timestamps.max()
+
+    def query(self, dim, grain):
+        """
+        DataFrame agregat untuk (dimensi, grain)
+
+        Kolom: <dim>, <grain>, snapshots, mean_occupancy, p90_occupancy,
+        penuh_snapshots, penuh_hours, penuh_share. penuh_hours dibatasi
+        panjang bucket (grain hour/hour_of_day: 1 jam per snapshot).
+        """
+        with self._lock:
+            frame = self._frames.get((dim, grain))
+            if frame is None:
+                frame = self.rollups[(dim, grain)].frame(dim, grain)
+                self._frames[(dim, grain)] = frame
+            return frame
+
+    def append_journal(self, df_occupancy, path=CACHE_PATH):
+        """
+        Append baris snapshot ke journal cache (bukan pickle ulang penuh)
+
+        Setiap worker meng-ingest snapshot yang sama; di bawah file lock
+        hanya baris yang lebih baru dari watermark journal yang ditulis,
+        sehingga setiap snapshot tercatat sekali. Journal di-compact ke
+        cache setelah melewati JOURNAL_COMPACT_BYTES.
+
+        Returns:
+            int - jumlah baris yang ditulis
+        """
+        journal_path = f"{path}.journal"
+        watermark_path = f"{journal_path}.watermark"
+        timestamps = pd.to_datetime(df_occupancy['timestamp'], errors='coerce')
+        with _file_lock(path):
+            mask = timestamps.notna().to_numpy()
+            try:
+                with open(watermark_path) as f:
+                    mask &= (timestamps > pd.Timestamp(f.read().strip())).to_numpy()
+            except (OSError, ValueError):
+                pass
+            if not mask.any():
+                return 0
+            with open(journal_path, 'ab') as f:
+                pickle.dump(df_occupancy.loc[mask, JOURNAL_COLUMNS], f)
+            with open(watermark_path, 'w') as f:
+                f.write(timestamps[mask].max().isoformat())
+            if os.path.getsize(journal_path) > JOURNAL_COMPACT_BYTES:
+                compacted, _ = self._load_locked(path)
+                compacted._save_locked(path)
+        return int(mask.sum())
+
+    def _replay(self, journal_path):
+        """Ingest snapshot dari journal; returns jumlah record journal"""
+        records = 0
+        try:
+            with open(journal_path, 'rb') as f:
+                while True:
+                    try:
+                        df_rows = pickle.load(f)
+                    except EOFError:
+                        break
+                    self.ingest(df_rows)
+                    records += 1
+        except FileNotFoundError:
+            pass
+        return records
+
+    @classmethod
+    def _load_locked(cls, path):
+        """Cache + replay journal; caller memegang _file_lock(path)"""
+        rollups = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    rollups = pickle.load(f)
+                if getattr(rollups, 'version', None) != CACHE_VERSION:
+                    rollups = None
+            except Exception as e:
+                print(f"⚠️ Cache rollups tidak valid, build ulang: {e}")
+        if rollups is None:
+            rollups = cls()
+        try:
+            replayed = rollups._replay(f"{path}.journal")
+        except Exception as e:
+            # Record terakhir bisa terpotong; sisanya sudah di-ingest
+            print(f"⚠️ Journal rollups tidak terbaca penuh: {e}")
+            replayed = 1
+        return rollups, replayed
+
+    def _save_locked(self, path):
+        """Tulis cache penuh lalu kosongkan journal; caller memegang _file_lock(path)"""
+        # Snapshot state di memori selama lock; query() tidak menunggu I/O disk
+        with self._lock:
+            data = pickle.dumps(self)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        # Isi journal sudah ada di cache (replay berikutnya juga difilter watermark)
+        open(f"{path}.journal", 'wb').close()
+
+    @classmethod
+    def load_or_build(cls, store=None, cache_path=CACHE_PATH):
+        """
+        Load rollups dari cache + journal, lalu ingest history (per shard
+        region dari ShardStore) hanya jika file history berubah sejak cache
+        dibuat. Cache ditulis ulang (dan journal dikosongkan) hanya jika ada
+        yang berubah.
+        """
+        store = store if store is not None else ShardStore()
+        history_mtime = store.history_version
+        try:
+            with _file_lock(cache_path):
+                rollups, replayed = cls._load_locked(cache_path)
+                changed = history_mtime is not None and history_mtime != rollups.history_mtime
+                if changed:
+                    rollups.ingest_history(store.iter_occupancy_history())
+                    rollups.history_mtime = history_mtime
+                if changed or replayed:
+                    rollups._save_locked(cache_path)
+        except OSError as e:
+            print(f"⚠️ Gagal menyimpan cache rollups: {e}")
+            rollups = cls()
+            if history_mtime is not None:
+                rollups.ingest_history(store.iter_occupancy_history())
+                rollups.history_mtime = history_mtime
+        return rollups
+
+
+if __name__ == "__main__":
+    # Lewat nama modul (bukan __main__) agar cache pickle bisa di-load oleh app
+    import occupancy_rollups
+    rollups = occupancy_rollups.OccupancyRollups.load_or_build()
+    print(f"✅ Rollups up to {rollups.watermark}")
+    print(rollups.query('kab', 'day').tail(10).to_string(index=False))
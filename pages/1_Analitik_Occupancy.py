@@ -0,0 +1,84 @@
+import streamlit as st
+
+from app_data import get_occupancy_refresher, get_rollups
+
+# Page configuration
+st.set_page_config(
+    page_title="CrowdAID - Analitik Occupancy",
+    page_icon="📈",
+    layout="wide"
+)
+
+# Load data
+occupancy_refresher = get_occupancy_refresher()
+rollups = get_rollups(occupancy_refresher)
+df_occupancy = occupancy_refresher.state.df_occupancy
+hospital_names = df_occupancy.drop_duplicates('hospital_id').set_index('hospital_id')['hospital_name'].str.strip()
+
+st.title("📈 Analitik Occupancy Historis")
+st.markdown(f"Data hingga **{rollups.watermark:%d %b %Y, %H:%M}**" if rollups.watermark is not None else "Belum ada data historis")
+st.markdown("---")
+
+dimension_options = {
+    'kab': "📍 Kabupaten/Kota",
+    'kelas': "🏛️ Kelas RS",
+    'hospital': "🏥 Rumah Sakit"
+}
+grain_options = {
+    'day': "Harian",
+    'hour': "Per Jam"
+}
+
+col1, col2 = st.columns(2)
+with col1:
+    dim = st.selectbox("Kelompokkan berdasarkan", options=list(dimension_options.keys()),
+                       format_func=lambda x: dimension_options[x])
+with col2:
+    grain = st.radio("Granularitas", options=list(grain_options.keys()),
+                     format_func=lambda x: grain_options[x], horizontal=True)
+
+
+def label_keys(frame):
+    """Ganti hospital_id dengan nama RS untuk tampilan"""
+    if dim == 'hospital':
+        frame = frame.copy()
+        frame['hospital'] = frame['hospital'].map(hospital_names).fillna(frame['hospital'].astype(str))
+    return frame
+
+
+trend = label_keys(rollups.query(dim, grain))
+if dim == 'hospital':
+    selected = st.multiselect("Pilih Rumah Sakit", sorted(trend['hospital'].unique()),
+                              default=sorted(trend['hospital'].unique())[:5])
+    trend = trend[trend['hospital'].isin(selected)]
+
+# Occupancy trend
+st.header("📊 Tren Occupancy")
+if len(trend) == 0:
+    st.warning("⚠️ Tidak ada data untuk ditampilkan.")
+else:
+    st.line_chart(trend.pivot(index=grain, columns=dim, values='mean_occupancy'))
+
+    # Hour-of-day profile
+    st.header("🕐 Occupancy per Jam dalam Sehari")
+    profile = label_keys(rollups.query(dim, 'hour_of_day'))
+    profile = profile[profile[dim].isin(trend[dim].unique())]
+    st.bar_chart(profile.pivot(index='hour_of_day', columns=dim, values='mean_occupancy'))
+
+    # Summary per group over the whole period, from the daily rollup
+    st.header("📋 Ringkasan Periode")
+    daily = label_keys(rollups.query(dim, 'day'))
+    daily = daily[daily[dim].isin(trend[dim].unique())]
+    daily = daily.assign(occupancy_total=daily['mean_occupancy'] * daily['snapshots'])
+    summary = daily.groupby(dim).agg(
+        occupancy_total=('occupancy_total', 'sum'),
+        p90_occupancy=('p90_occupancy', 'max'),
+        penuh_hours=('penuh_hours', 'sum'),
+        snapshots=('snapshots', 'sum')
+    )
+    summary.insert(0, 'mean_occupancy', summary.pop('occupancy_total') / summary['snapshots'])
+    summary = summary.sort_values('mean_occupancy', ascending=False)
+    summary.columns = ['Avg Occupancy (%)', 'Max Harian P90 (%)', 'Waktu PENUH (jam)', 'Snapshot']
+    st.dataframe(summary.round(1), use_container_width=True)
+
+st.caption("Waktu PENUH dihitung dari jumlah snapshot berstatus PENUH x interval snapshot (per hari).")
@@ -0,0 +1,25 @@
+"""
+CrowdAID - Patient Mix
+Campuran kondisi dan urgensi pasien yang realistis, dipakai bersama oleh
+load test dan simulator: sebagian besar pasien datang dengan gejala ringan
+dan tidak mendesak
+"""
+
+
+# Proporsi pasien per kode kondisi
+KONDISI_MIX = {
+    "1": 0.35,   # Gejala Ringan
+    "2": 0.18,   # Penyakit Dalam
+    "3": 0.08,   # Bedah
+    "4": 0.12,   # Anak
+    "5": 0.10,   # Kebidanan
+    "6": 0.07,   # Gigi
+    "7": 0.10    # Banyak Spesialis
+}
+
+# Proporsi pasien per tingkat urgensi
+URGENCY_MIX = {
+    "Tidak Mendesak": 0.60,
+    "Mendesak": 0.30,
+    "Darurat": 0.10
+}
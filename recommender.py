@@ -0,0 +1,477 @@
+"""
+CrowdAID - Recommendation Engine
+Membangun rekomendasi fasilitas kesehatan sebagai satu DataFrame kolumnar
+dan meranking-nya secara vectorized (tanpa dict per baris)
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from scoring import CONDITION_NAMES
+
+
+# Kolom tetap dari tabel rekomendasi. Kolom yang tidak relevan untuk Faskes
+# (kapasitas, layanan, staff, available_beds, hospital_id) bernilai NaN.
+# ml_probability, score dan ml_factors (faktor fitur terbesar untuk
+# prediksi ML) diisi oleh HospitalScorer jika tersedia; surge menandai
+# hospital yang sedang di-flag oleh SurgeDetector.
+REC_COLUMNS = ['hospital_id', 'nama', 'alamat', 'tipe', 'kelas', 'kapasitas', 'layanan', 'staff',
+               'status', 'occupancy', 'wait_time', 'available_beds', 'priority',
+               'ml_probability', 'score', 'ml_factors', 'surge']
+
+KONDISI_MAP = {
+    "2": "Penyakit Dalam",
+    "3": "Bedah",
+    "4": "Anak",
+    "5": "Kebidanan"
+}
+
+MAX_DISPLAY = 10
+
+# Kabupaten/kota yang berbatasan (untuk saran "RS di kabupaten terdekat")
+NEIGHBOURS = {
+    'Kota Tangerang': ['Tangerang', 'Kota Tangerang Selatan', 'Kota Jakarta Utara'],
+    'Kota Tangerang Selatan': ['Kota Tangerang', 'Tangerang'],
+    'Tangerang': ['Kota Tangerang', 'Kota Tangerang Selatan', 'Serang', 'Lebak'],
+    'Serang': ['Kota Serang', 'Kota Cilegon', 'Tangerang', 'Lebak', 'Pandeglang'],
+    'Kota Serang': ['Serang'],
+    'Kota Cilegon': ['Serang'],
+    'Pandeglang': ['Serang', 'Lebak'],
+    'Lebak': ['Pandeglang', 'Serang', 'Tangerang'],
+    'Kota Jakarta Utara': ['Kota Tangerang']
+}
+
+# Ambang smart suggestion; alternatif bisa dievaluasi dengan simulator.py
+DEFAULT_POLICY = {
+    # Kelas C: sarankan kabupaten terdekat jika lebih dari rasio ini RS
+    # berstatus PENUH/HAMPIR PENUH
+    'kelas_c_full_ratio': 0.6,
+    # Kelas B: sarankan menunda (non-urgent) jika lebih dari rasio ini RS
+    # ber-occupancy >= kelas_b_busy_occupancy
+    'kelas_b_busy_occupancy': 85,
+    'kelas_b_busy_ratio': 0.5
+}
+
+GEJALA_RINGAN_INFO = """
+**🤖 AI Classification Result:**
+- **Kategori:** Gejala Ringan
+- **Rekomendasi:** Puskesmas atau Klinik Pratama
+- **Alasan:** Kondisi tidak memerlukan fasilitas RS
+"""
+
+GEJALA_RINGAN_SUGGESTION = """
+💡 **Smart Suggestion:**
+✅ **Sangat dianjurkan untuk pergi ke Puskesmas/Klinik saja!**
+
+Alasan:
+- 🏥 Gejala Anda tidak memerlukan fasilitas rumah sakit
+- ⏱️ Waktu tunggu lebih singkat (5-15 menit)
+- 💰 Biaya lebih murah
+- 🎯 Puskesmas/Klinik sudah cukup untuk menangani kondisi ini
+- 📉 Membantu mengurangi beban RS untuk kasus yang lebih serius
+"""
+
+GIGI_INFO = """
+**🤖 AI Classification Result:**
+- **Kategori:** Kesehatan Gigi
+- **Rekomendasi:** RS Kelas D atau Klinik Gigi
+- **Alasan:** Masalah gigi memerlukan fasilitas dental khusus
+"""
+
+GIGI_SUGGESTION = """
+⚠️ **Smart Suggestion:**
+🔄 **Pertimbangkan alternatif: Klinik Gigi**
+
+Alasan:
+- 🔴 Semua RS Kelas D sedang penuh
+- ⏱️ Waktu tunggu di RS sangat lama (3-5 jam)
+- 🏥 Klinik Gigi dapat menangani sebagian besar masalah gigi
+- 💡 Lebih cepat dan efisien untuk kasus non-darurat
+"""
+
+SPESIALIS_INFO = """
+**🤖 AI Classification Result:**
+- **Kategori:** Komprehensif / Multi-Spesialis
+- **Rekomendasi:** RS Kelas B
+- **Alasan:** Kondisi kompleks memerlukan banyak spesialis
+"""
+
+SPESIALIS_SUGGESTION = """
+💡 **Smart Suggestion:**
+📅 **Pertimbangkan untuk menunda kunjungan non-urgent**
+
+Alasan:
+- 🟡 Sebagian besar RS Kelas B sedang sibuk (>85% penuh)
+- ⏱️ Waktu tunggu rata-rata 2-3 jam
+- 📆 Occupancy biasanya lebih rendah di pagi hari (07:00-09:00)
+- 🎯 Jika tidak mendesak, jadwalkan untuk besok pagi
+"""
+
+KELAS_C_INFO = """
+**🤖 AI Classification Result:**
+- **Kategori:** {kategori}
+- **Rekomendasi:** RS Kelas C
+- **Alasan:** Kondisi memerlukan perawatan RS dengan spesialisasi
+"""
+
+KELAS_C_SUGGESTION = """
+⚠️ **Smart Suggestion:**
+🔄 **Pertimbangkan RS di kabupaten terdekat**
+
+Alasan:
+- 🔴 Banyak RS Kelas C di area ini sedang penuh/hampir penuh
+- ⏱️ Waktu tunggu sangat lama (2-4 jam)
+- 🚗 RS di kabupaten sekitar mungkin lebih cepat
+"""
+
+
+class RecommendationResult:
+    """
+    Hasil rekomendasi untuk satu request
+
+    Attributes:
+        recs: DataFrame dengan kolom REC_COLUMNS, sudah terurut
+              (priority, score atau occupancy)
+        classification_info: str - markdown hasil klasifikasi
+        smart_suggestion: str - markdown saran, kosong jika tidak ada
+    """
+
+    __slots__ = ('recs', 'classification_info', 'smart_suggestion')
+
+    def __init__(self, recs, classification_info, smart_suggestion=""):
+        self.recs = recs
+        self.classification_info = classification_info
+        self.smart_suggestion = smart_suggestion
+
+    def __len__(self):
+        return len(self.recs)
+
+    @property
+    def priority_1(self):
+        """Rekomendasi dengan priority 1"""
+        return self.recs[self.recs['priority'].to_numpy() == 1]
+
+    @property
+    def best(self):
+        """
+        Rekomendasi terbaik di antara priority 1 (score tertinggi, atau
+        occupancy terendah tanpa scorer), None jika tidak ada. Karena recs
+        sudah terurut, ini baris pertama.
+        """
+        if len(self.recs) and self.recs['priority'].iat[0] == 1:
+            return self.recs.iloc[0]
+        return None
+
+
+def merge_occupancy(df_hospital, df_occupancy):
+    """
+    Gabungkan data hospital dengan occupancy, isi nilai kosong dengan default
+    """
+    df_merged = df_hospital.merge(
+        df_occupancy[['hospital_id', 'occupancy_rate', 'status', 'available_beds', 'wait_time_minutes']],
+        left_on='id',
+        right_on='hospital_id',
+        how='left'
+    )
+
+    df_merged['occupancy_rate'] = df_merged['occupancy_rate'].fillna(75.0)
+    df_merged['status'] = df_merged['status'].fillna('NORMAL')
+    df_merged['available_beds'] = df_merged['available_beds'].fillna(df_merged['total_tempat_tidur'] * 0.25)
+    df_merged['wait_time_minutes'] = df_merged['wait_time_minutes'].fillna(30)
+    return df_merged
+
+
+class RegionViews:
+    """
+    Hasil merge_occupancy per kabupaten/kota untuk snapshot occupancy terkini
+
+    View dibangun saat kabupaten pertama kali di-query dan disimpan di cache
+    LRU dengan batas yang sama seperti shard resident di store.
+    update(snapshot) memakai change set snapshot: hanya view kabupaten yang
+    punya hospital berubah yang di-merge ulang, sisanya dipakai ulang apa
+    adanya. View dibagi antar session, jangan dimodifikasi in-place.
+    """
+
+    def __init__(self, store, max_resident=None):
+        self.store = store
+        self.max_resident = max_resident or store.max_resident
+        self._lock = threading.Lock()
+        # hospital id -> kabupaten, hanya untuk view yang resident
+        self._kab_of = {}
+        self._ids_of = {}
+        # (df_occupancy, loaded_at, OrderedDict kab -> df_merged), di-swap sekaligus
+        self._state = (None, None, OrderedDict())
+
+    def update(self, snapshot):
+        changes = snapshot.changes
+        with self._lock:
+            _, loaded_at, views = self._state
+            if changes is None or changes.base_loaded_at != loaded_at:
+                views = OrderedDict()
+                self._kab_of, self._ids_of = {}, {}
+            else:
+                views = OrderedDict(views)
+                affected = {self._kab_of[i] for i in changes.hospital_ids.tolist() if i in self._kab_of}
+                for kab in affected & set(views):
+                    views[kab] = merge_occupancy(self.store.hospitals(kab), snapshot.df_occupancy)
+            self._state = (snapshot.df_occupancy, snapshot.loaded_at, views)
+
+    def merged(self, kabupaten, df_occupancy):
+        """df_merged untuk kabupaten; merge langsung jika df_occupancy bukan snapshot terkini"""
+        current, _, views = self._state
+        df_hospital = self.store.hospitals(kabupaten)
+        if df_occupancy is not current:
+            return merge_occupancy(df_hospital, df_occupancy)
+        with self._lock:
+            view = views.get(kabupaten)
+            if view is not None:
+                views.move_to_end(kabupaten)
+                return view
+
+        view = merge_occupancy(df_hospital, df_occupancy)
+        with self._lock:
+            if self._state[2] is views:
+                ids = df_hospital['id'].tolist()
+                views[kabupaten] = view
+                self._ids_of[kabupaten] = ids
+                self._kab_of.update(dict.fromkeys(ids, kabupaten))
+                while len(views) > self.max_resident:
+                    evicted, _ = views.popitem(last=False)
+                    for hospital_id in self._ids_of.pop(evicted, []):
+                        if self._kab_of.get(hospital_id) == evicted:
+                            del self._kab_of[hospital_id]
+        return view
+
+    @property
+    def resident_views(self):
+        return list(self._state[2].keys())
+
+
+def _hospital_recs(rs, kelas, priority, with_staff=False):
+    """Kolom rekomendasi dari potongan df_merged (tanpa iterasi baris)"""
+    return pd.DataFrame({
+        'hospital_id': rs['id'].to_numpy(dtype=float),
+        'nama': rs['nama'].to_numpy(),
+        'alamat': rs['alamat'].to_numpy(),
+        'tipe': rs['jenis'].to_numpy(),
+        'kelas': kelas,
+        'kapasitas': rs['total_tempat_tidur'].to_numpy(dtype=float),
+        'layanan': rs['total_layanan'].to_numpy(dtype=float),
+        'staff': rs['total_tenaga_kerja'].to_numpy(dtype=float) if with_staff else np.nan,
+        'status': rs['status'].to_numpy(),
+        'occupancy': rs['occupancy_rate'].to_numpy(dtype=float),
+        'wait_time': rs['wait_time_minutes'].to_numpy(dtype=np.int64),
+        'available_beds': rs['available_beds'].to_numpy(dtype=np.int64).astype(float),
+        'priority': priority,
+        'ml_probability': np.nan,
+        'score': np.nan,
+        'ml_factors': None,
+        'surge': False
+    }, columns=REC_COLUMNS)
+
+
+def _faskes_recs(faskes, tipe, wait_time, priority):
+    """Kolom rekomendasi dari potongan df_faskes (Puskesmas/Klinik)"""
+    return pd.DataFrame({
+        'hospital_id': np.nan,
+        'nama': faskes['NamaFaskes'].str.strip().to_numpy(),
+        'alamat': faskes['AlamatFaskes'].to_numpy(),
+        'tipe': tipe,
+        'kelas': '-',
+        'kapasitas': np.nan,
+        'layanan': np.nan,
+        'staff': np.nan,
+        'status': 'TERSEDIA',
+        'occupancy': 0.0,
+        'wait_time': wait_time,
+        'available_beds': np.nan,
+        'priority': priority,
+        'ml_probability': np.nan,
+        'score': np.nan,
+        'ml_factors': None,
+        'surge': False
+    }, index=np.arange(len(faskes)), columns=REC_COLUMNS)
+
+
+def _faskes_in(df_faskes, kabupaten, tipe_pattern=None, tipe_exact=None):
+    mask = df_faskes['KotaKab'].str.contains(kabupaten, case=False, na=False)
+    if tipe_exact is not None:
+        mask &= df_faskes['TipeFaskes'] == tipe_exact
+    if tipe_pattern is not None:
+        mask &= df_faskes['TipeFaskes'].str.contains(tipe_pattern, case=False, na=False)
+    return df_faskes[mask]
+
+
+def rank_order(priority, key):
+    """
+    Urutan index berdasarkan (priority, key) menaik, stabil terhadap urutan
+    input
+    """
+    return np.lexsort((np.asarray(key, dtype=float), np.asarray(priority)))
+
+
+def rank_recommendations(recs):
+    """
+    Urutkan DataFrame rekomendasi: priority, hospital dengan surge di
+    belakang priority yang sama, lalu score tertinggi jika ada, selain itu
+    occupancy terendah
+    """
+    if len(recs) == 0:
+        return recs
+    scores = recs['score'].to_numpy(dtype=float)
+    if np.isnan(scores).all():
+        key = recs['occupancy'].to_numpy()
+    else:
+        key = -np.nan_to_num(scores, nan=-np.inf)
+    priority = recs['priority'].to_numpy() * 2 + recs['surge'].to_numpy(dtype=np.int64)
+    order = rank_order(priority, key)
+    return recs.iloc[order].reset_index(drop=True)
+
+
+def apply_surge(recs, flagged):
+    """Tandai kandidat yang hospital_id-nya sedang di-flag surge"""
+    if not flagged or len(recs) == 0:
+        return recs
+    recs = recs.copy()
+    recs['surge'] = recs['hospital_id'].isin(list(flagged)).to_numpy()
+    return recs
+
+
+def apply_scores(recs, scorer, kondisi, urgency, distance=None, weights=None):
+    """
+    Isi kolom ml_probability, score dan ml_factors untuk semua kandidat
+    sekaligus
+    """
+    if scorer is None or len(recs) == 0:
+        return recs
+    scores, probability = scorer.score(
+        recs['hospital_id'].to_numpy(),
+        recs['occupancy'].to_numpy(),
+        recs['available_beds'].to_numpy(),
+        recs['wait_time'].to_numpy(),
+        CONDITION_NAMES[kondisi],
+        urgency,
+        distance=distance,
+        weights=weights
+    )
+    recs = recs.copy()
+    recs['ml_probability'] = probability
+    recs['score'] = scores
+    recs['ml_factors'] = scorer.explain(recs['hospital_id'].to_numpy(), CONDITION_NAMES[kondisi])
+    return recs
+
+
+def get_recommendations(df_merged, df_faskes, kabupaten, kondisi, urgency, scorer=None,
+                        flagged=None, policy=None, weights=None):
+    """
+    Bangun rekomendasi untuk satu pasien
+
+    Args:
+        df_merged: DataFrame hospital + occupancy (lihat merge_occupancy)
+        df_faskes: DataFrame Faskes BPJS
+        kabupaten: str - kabupaten/kota
+        kondisi: str - kode kondisi "1".."7"
+        urgency: str - "Tidak Mendesak" / "Mendesak" / "Darurat"
+        scorer: HospitalScorer (optional) - jika ada, kandidat dalam priority
+                yang sama diranking berdasarkan multi-criteria score
+        flagged: set hospital_id yang sedang surge (optional) - diturunkan
+                 ke belakang dalam priority yang sama
+        policy: dict (optional) - override sebagian DEFAULT_POLICY
+        weights: dict bobot kriteria (optional) - default
+                 scoring.URGENCY_WEIGHTS sesuai urgency
+
+    Returns:
+        RecommendationResult
+    """
+    policy = {**DEFAULT_POLICY, **(policy or {})}
+    parts = []
+    smart_suggestion = ""
+
+    if kondisi == "1":
+        classification_info = GEJALA_RINGAN_INFO
+        smart_suggestion = GEJALA_RINGAN_SUGGESTION
+
+        puskesmas = _faskes_in(df_faskes, kabupaten, tipe_exact='Puskesmas')
+        klinik = _faskes_in(df_faskes, kabupaten, tipe_pattern='Klinik')
+
+        parts.append(_faskes_recs(puskesmas.head(5), 'Puskesmas', 10, 1))
+        parts.append(_faskes_recs(klinik.head(3), 'Klinik Pratama', 15, 2))
+
+    elif kondisi == "6":
+        classification_info = GIGI_INFO
+
+        rs_d = df_merged[(df_merged['kelas'] == 'D') & (df_merged['kab'] == kabupaten)]
+
+        # Check if all full
+        all_full = bool((rs_d['status'] == 'PENUH').all())
+        if all_full:
+            smart_suggestion = GIGI_SUGGESTION
+
+        parts.append(_hospital_recs(rs_d, 'D', 1))
+
+        klinik_gigi = _faskes_in(df_faskes, kabupaten, tipe_pattern='Gigi')
+        parts.append(_faskes_recs(klinik_gigi.head(3), 'Klinik Gigi', 20, 2 if all_full else 3))
+
+    elif kondisi == "7":
+        classification_info = SPESIALIS_INFO
+
+        rs_b = df_merged[
+            (df_merged['kelas'] == 'B') & (df_merged['kab'] == kabupaten)
+        ].sort_values('total_layanan', ascending=False)
+
+        # Check occupancy
+        high_occupancy_count = int((rs_b['occupancy_rate'] >= policy['kelas_b_busy_occupancy']).sum())
+        if urgency == "Tidak Mendesak" and high_occupancy_count > len(rs_b) * policy['kelas_b_busy_ratio']:
+            smart_suggestion = SPESIALIS_SUGGESTION
+
+        parts.append(_hospital_recs(rs_b, 'B', 1, with_staff=True))
+
+    else:
+        classification_info = KELAS_C_INFO.format(kategori=KONDISI_MAP[kondisi])
+
+        rs_c = df_merged[(df_merged['kelas'] == 'C') & (df_merged['kab'] == kabupaten)]
+
+        # Check if many are full
+        full_count = int(rs_c['status'].isin(['PENUH', 'HAMPIR PENUH']).sum())
+        if full_count > len(rs_c) * policy['kelas_c_full_ratio']:
+            smart_suggestion = KELAS_C_SUGGESTION
+
+        rs_umum = rs_c[rs_c['jenis'].str.contains('Umum', case=False, na=False)]
+        if kondisi in ["3", "4", "5"]:
+            spesialis_pattern = 'Bedah' if kondisi == "3" else 'Ibu dan Anak'
+            rs_spesialis = rs_c[rs_c['jenis'].str.contains(spesialis_pattern, case=False, na=False)]
+            parts.append(_hospital_recs(rs_spesialis, 'C', 1))
+            parts.append(_hospital_recs(rs_umum.head(5), 'C', 2))
+        else:
+            rs_umum = rs_umum.sort_values('total_layanan', ascending=False)
+            parts.append(_hospital_recs(rs_umum, 'C', 1))
+
+    recs = apply_scores(pd.concat(parts, ignore_index=True), scorer, kondisi, urgency, weights=weights)
+    recs = apply_surge(recs, flagged)
+    return RecommendationResult(rank_recommendations(recs), classification_info, smart_suggestion)
+
+
+def recommend(store, df_occupancy, kabupaten, kondisi, urgency, scorer=None, flagged=None, views=None,
+              weights=None):
+    """
+    Jalur rekomendasi lengkap untuk satu request: load shard kabupaten,
+    merge occupancy, lalu get_recommendations. Dipakai app dan load test.
+
+    Args:
+        store: ShardStore
+        df_occupancy: DataFrame occupancy snapshot terkini
+        views: RegionViews (optional) - pakai ulang hasil merge per kabupaten
+        weights: dict bobot kriteria (optional), diteruskan ke scorer
+    """
+    df_hospital = store.hospitals(kabupaten)
+    if scorer is not None:
+        scorer.add_hospitals(df_hospital)
+    if views is not None:
+        df_merged = views.merged(kabupaten, df_occupancy)
+    else:
+        df_merged = merge_occupancy(df_hospital, df_occupancy)
+    return get_recommendations(df_merged, store.faskes(kabupaten), kabupaten, kondisi, urgency,
+                               scorer=scorer, flagged=flagged, weights=weights)
@@ -0,0 +1,187 @@
+"""
+CrowdAID - Multi-Criteria Scoring
+Satu tahap scoring vectorized yang menggabungkan ML suitability, occupancy,
+bed tersedia, waktu tunggu dan jarak (jika diketahui)
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ml_predictor import top_factors
+
+
+# Kode kondisi di app -> nama kondisi di model
+CONDITION_NAMES = {
+    "1": "Gejala Ringan",
+    "2": "Penyakit Dalam",
+    "3": "Bedah",
+    "4": "Anak",
+    "5": "Kebidanan",
+    "6": "Gigi",
+    "7": "Banyak Spesialis"
+}
+
+CRITERIA = ['suitability', 'occupancy', 'available_beds', 'wait_time', 'distance']
+
+# Bobot per tingkat urgensi. Semakin darurat, bed tersedia dan jarak
+# semakin penting dibanding occupancy rata-rata.
+URGENCY_WEIGHTS = {
+    "Tidak Mendesak": {'suitability': 0.35, 'occupancy': 0.30, 'available_beds': 0.10,
+                       'wait_time': 0.15, 'distance': 0.10},
+    "Mendesak": {'suitability': 0.35, 'occupancy': 0.20, 'available_beds': 0.15,
+                 'wait_time': 0.20, 'distance': 0.10},
+    "Darurat": {'suitability': 0.30, 'occupancy': 0.10, 'available_beds': 0.25,
+                'wait_time': 0.15, 'distance': 0.20}
+}
+
+MAX_WAIT_MINUTES = 240
+NEUTRAL = 0.5
+
+
+def _weight_vector(urgency, weights=None):
+    weights = weights or URGENCY_WEIGHTS.get(urgency, URGENCY_WEIGHTS["Tidak Mendesak"])
+    return np.array([weights.get(c, 0.0) for c in CRITERIA], dtype=float)
+
+
+def criteria_matrix(suitability, occupancy, available_beds, wait_time, distance=None):
+    """
+    Normalisasi semua kriteria ke 0-1 (lebih tinggi = lebih baik)
+
+    Nilai NaN (mis. bed untuk Faskes) diisi NEUTRAL. Jika distance None,
+    kolom jarak seluruhnya NaN dan bobotnya diabaikan di score_matrix.
+
+    Returns:
+        array (n, len(CRITERIA))
+    """
+    n = len(occupancy)
+    matrix = np.empty((n, len(CRITERIA)))
+    matrix[:, 0] = np.asarray(suitability, dtype=float)
+    matrix[:, 1] = 1 - np.clip(np.asarray(occupancy, dtype=float) / 100, 0, 1)
+
+    beds = np.clip(np.asarray(available_beds, dtype=float), 0, None)
+    max_beds = np.nanmax(beds) if np.isfinite(beds).any() else np.nan
+    matrix[:, 2] = beds / max_beds if max_beds and max_beds > 0 else np.nan
+
+    matrix[:, 3] = 1 - np.clip(np.asarray(wait_time, dtype=float) / MAX_WAIT_MINUTES, 0, 1)
+
+    if distance is None:
+        matrix[:, 4] = np.nan
+    else:
+        distance = np.asarray(distance, dtype=float)
+        max_distance = np.nanmax(distance) if np.isfinite(distance).any() else np.nan
+        matrix[:, 4] = 1 - distance / max_distance if max_distance and max_distance > 0 else NEUTRAL
+    return matrix
+
+
+def score_matrix(matrix, urgency, weights=None):
+    """
+    Weighted score 0-100 untuk setiap baris criteria_matrix
+
+    Kriteria yang tidak diketahui untuk seluruh kandidat tidak ikut
+    dibobot; NaN per baris diperlakukan sebagai NEUTRAL.
+    """
+    w = _weight_vector(urgency, weights)
+    known = ~np.isnan(matrix).all(axis=0) if len(matrix) else np.ones(len(CRITERIA), bool)
+    w = np.where(known, w, 0.0)
+    total = w.sum()
+    if total <= 0:
+        return np.zeros(len(matrix))
+    filled = np.where(np.isnan(matrix), NEUTRAL, matrix)
+    return filled @ (w / total) * 100
+
+
+class HospitalScorer:
+    """
+    Scorer bersama untuk Streamlit UI dan konsumen batch/API
+
+    Probability ML dan kontribusi fitur (penjelasan) untuk semua hospital x
+    kondisi dihitung sekali per hospital (fitur model statis), sehingga
+    scoring dan penjelasan per request hanya operasi array. Hospital bisa ditambahkan bertahap (add_hospitals),
+    misalnya saat shard kabupaten baru di-load.
+    """
+
+    def __init__(self, predictor, df_hospital=None):
+        self.predictor = predictor
+        self.suitability = pd.DataFrame(columns=predictor.metadata['conditions'], dtype=float)
+        self.contributions = None
+        self._index = pd.Index(self.suitability.index)
+        self._lock = threading.Lock()
+        if df_hospital is not None:
+            self.add_hospitals(df_hospital)
+
+    def add_hospitals(self, df_hospital):
+        """Hitung probability untuk hospital yang belum dikenal scorer"""
+        new = df_hospital[~df_hospital['id'].isin(self._index)]
+        if len(new) == 0:
+            return
+        with self._lock:
+            new = new[~new['id'].isin(self.suitability.index)].drop_duplicates('id')
+            if len(new) == 0:
+                return
+            suitability = pd.concat([self.suitability, self.predictor.suitability_matrix(new)])
+            contributions = self.predictor.contribution_matrix(new)
+            if self.contributions is not None:
+                contributions = pd.concat([self.contributions, contributions])
+            # Hash table Index pandas dibangun lazy dan tidak thread-safe;
+            # bangun sekali di sini sebelum Index dipakai bersama
+            index = pd.Index(suitability.index)
+            index.get_indexer(index)
+            # Swap index dan matrix bersama-sama untuk pembaca lain
+            self.suitability, self.contributions, self._index = suitability, contributions, index
+
+    def preload(self, suitability, contributions):
+        """
+        Pakai matrix yang sudah dihitung sebelumnya (mis. dari serving_state)
+        sebagai isi scorer; hospital lain tetap bisa ditambahkan bertahap
+        """
+        index = pd.Index(suitability.index)
+        index.get_indexer(index)
+        with self._lock:
+            self.suitability, self.contributions, self._index = suitability, contributions, index
+
+    def probability(self, hospital_ids, condition):
+        """
+        Probability suitability untuk array hospital id; NaN untuk id yang
+        tidak dikenal (mis. baris Faskes)
+        """
+        suitability, index = self.suitability, self._index
+        if condition not in suitability.columns or len(index) == 0:
+            return np.full(len(hospital_ids), np.nan)
+        pos = index.get_indexer(np.asarray(hospital_ids))
+        values = suitability[condition].to_numpy(dtype=float)
+        return np.where(pos >= 0, values[np.clip(pos, 0, None)], np.nan)
+
+    def explain(self, hospital_ids, condition, n=3):
+        """
+        Faktor fitur terbesar untuk prediksi suitability setiap hospital
+
+        Returns:
+            list str (mis. 'Kelas RS +12%, Jumlah Layanan +5%'), None untuk
+            id yang tidak dikenal
+        """
+        contributions, index = self.contributions, self._index
+        if contributions is None or condition not in contributions.columns.levels[0]:
+            return [None] * len(hospital_ids)
+        values = contributions[condition].to_numpy(dtype=float)
+        pos = index.get_indexer(np.asarray(hospital_ids))
+        # Index bisa sudah lebih baru dari matrix yang dibaca (add_hospitals)
+        pos = np.where(pos < len(values), pos, -1)
+        values = values[np.clip(pos, 0, None)]
+        values[pos < 0] = np.nan
+        return top_factors(values, self.predictor.metadata['feature_columns'], n)
+
+    def score(self, hospital_ids, occupancy, available_beds, wait_time, condition,
+              urgency, distance=None, weights=None, default_suitability=1.0):
+        """
+        Score 0-100 untuk sekumpulan kandidat
+
+        Returns:
+            (scores, probability) - probability berisi NaN untuk kandidat
+            non-RS, yang dinilai dengan default_suitability
+        """
+        probability = self.probability(hospital_ids, condition)
+        suitability = np.where(np.isnan(probability), default_suitability, probability)
+        matrix = criteria_matrix(suitability, occupancy, available_beds, wait_time, distance)
+        return score_matrix(matrix, urgency, weights), probability
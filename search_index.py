@@ -0,0 +1,244 @@
+"""
+CrowdAID - Facility Search Index
+Inverted index trigram atas nama dan alamat Rumah Sakit dan Faskes untuk
+pencarian fuzzy (typeahead), dengan data occupancy terkini untuk RS
+
+Usage:
+    python search_index.py "rs ciputra"
+"""
+
+import os
+import pickle
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from shard_store import ShardStore
+
+
+INDEX_NAME = 'search_index.pkl'
+
+# Bobot kecocokan alamat relatif terhadap nama
+ADDRESS_WEIGHT = 0.3
+# Bonus jika nama diawali query (prefix match)
+PREFIX_BONUS = 0.5
+MIN_SCORE = 0.2
+
+
+def normalize(text):
+    text = re.sub(r'[^0-9a-z]+', ' ', str(text).lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def trigrams(text):
+    """Trigram per kata dengan padding, mis. 'rs' -> '  r', ' rs', 'rs '"""
+    grams = []
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _postings(texts):
+    """
+    Inverted index trigram -> array doc id (unik per dokumen)
+    """
+    postings = {}
+    for doc_id, text in enumerate(texts):
+        for gram in set(trigrams(text)):
+            postings.setdefault(gram, []).append(doc_id)
+    return {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+
+class SearchIndex:
+    """
+    Trigram index atas semua RS dan Faskes
+
+    Skor = jumlah bobot IDF trigram query yang cocok di nama (+ alamat
+    dengan ADDRESS_WEIGHT), dinormalisasi dengan total bobot query. Setiap
+    keystroke hanya menjumlahkan posting list dengan np.bincount.
+    """
+
+    def __init__(self, docs):
+        """
+        Args:
+            docs: DataFrame dengan kolom kind, nama, alamat, kab, tipe,
+                  hospital_id, search_name
+        """
+        self.docs = docs.reset_index(drop=True)
+        self.n_docs = len(self.docs)
+        self.name_postings = _postings(self.docs['search_name'])
+        self.address_postings = _postings(self.docs['alamat'])
+        self.normalized_names = [normalize(name) for name in self.docs['search_name']]
+        self.kinds = self.docs['kind'].to_numpy()
+        self.records = self.docs[['kind', 'nama', 'alamat', 'kab', 'tipe', 'hospital_id']].to_dict('records')
+        self.sources = None
+        self._occupancy_source = None
+        self._occupancy = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_occupancy_source'] = None
+        state['_occupancy'] = {}
+        return state
+
+    @classmethod
+    def from_frames(cls, df_hospital, df_faskes):
+        hospitals = pd.DataFrame({
+            'kind': 'RS',
+            'nama': df_hospital['nama'].str.strip(),
+            'alamat': df_hospital['alamat'].fillna(''),
+            'kab': df_hospital['kab'],
+            'tipe': df_hospital['jenis'],
+            'hospital_id': df_hospital['id'],
+            'search_name': df_hospital['nama']
+        })
+        faskes_name = df_faskes['NamaFaskes'].str.strip()
+        faskes_tipe = df_faskes['TipeFaskes'].fillna('')
+        # Nama Puskesmas di data tidak memuat kata "Puskesmas"; tambahkan tipe
+        # agar query seperti "Puskesmas Majasari" tetap cocok
+        with_tipe = [
+            name if normalize(name).startswith(normalize(tipe)) else f"{tipe} {name}"
+            for name, tipe in zip(faskes_name, faskes_tipe)
+        ]
+        faskes = pd.DataFrame({
+            'kind': 'Faskes',
+            'nama': faskes_name,
+            'alamat': df_faskes['AlamatFaskes'].fillna(''),
+            'kab': df_faskes['KotaKab_Clean'],
+            'tipe': faskes_tipe,
+            'hospital_id': np.nan,
+            'search_name': with_tipe
+        })
+        return cls(pd.concat([hospitals, faskes], ignore_index=True))
+
+    @classmethod
+    def load_or_build(cls, store):
+        """
+        Load index dari direktori shard, build ulang jika shard berubah.
+        Shard dibaca langsung (tidak lewat cache LRU store).
+        """
+        path = os.path.join(store.root, INDEX_NAME)
+        sources = store.manifest.get('sources')
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    index = pickle.load(f)
+                if index.sources == sources:
+                    return index
+            except Exception as e:
+                print(f"⚠️ Search index tidak valid, build ulang: {e}")
+
+        manifest = store.manifest
+        df_hospital = pd.concat([
+            pd.read_csv(os.path.join(store.root, region['hospital']), sep=';')
+            for region in manifest['regions'].values()
+        ], ignore_index=True)
+        df_faskes = pd.concat([
+            pd.read_csv(os.path.join(store.root, shard['path']))
+            for shard in manifest['faskes'].values()
+        ], ignore_index=True)
+
+        index = cls.from_frames(df_hospital, df_faskes)
+        index.sources = sources
+        try:
+            # Tulis ke file tmp per proses lalu replace: pembaca tidak melihat file setengah jadi
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(index, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Gagal menyimpan search index: {e}")
+        return index
+
+    def _occupancy_lookup(self, df_occupancy):
+        # Snapshot occupancy immutable, jadi cukup di-index sekali per snapshot
+        if df_occupancy is not self._occupancy_source:
+            self._occupancy = {
+                row.hospital_id: row for row in
+                df_occupancy[['hospital_id', 'occupancy_rate', 'status', 'available_beds',
+                              'wait_time_minutes']].itertuples(index=False)
+            }
+            self._occupancy_source = df_occupancy
+        return self._occupancy
+
+    def search(self, query, k=10, df_occupancy=None, kind=None):
+        """
+        Cari fasilitas berdasarkan nama/alamat
+
+        Args:
+            query: str - teks yang diketik user
+            k: int - jumlah hasil maksimal
+            df_occupancy: DataFrame occupancy terkini (optional) untuk RS
+            kind: 'RS' / 'Faskes' (optional) - filter jenis fasilitas
+
+        Returns:
+            list of dict (nama, alamat, kab, tipe, kind, hospital_id, score,
+            dan occupancy_rate/status/available_beds/wait_time jika RS)
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        scores = np.zeros(self.n_docs)
+        total_weight = 0.0
+        for gram in grams:
+            name_ids = self.name_postings.get(gram)
+            address_ids = self.address_postings.get(gram)
+            df = max(len(name_ids) if name_ids is not None else 0,
+                     len(address_ids) if address_ids is not None else 0, 1)
+            weight = np.log1p(self.n_docs / df)
+            total_weight += weight
+            if name_ids is not None:
+                scores += np.bincount(name_ids, minlength=self.n_docs) * weight
+            if address_ids is not None:
+                scores += np.bincount(address_ids, minlength=self.n_docs) * (weight * ADDRESS_WEIGHT)
+        scores /= total_weight
+
+        if kind is not None:
+            scores[self.kinds != kind] = 0
+
+        n_candidates = min(k * 4, self.n_docs)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates = candidates[scores[candidates] >= MIN_SCORE]
+
+        normalized_query = normalize(query)
+        results = []
+        for doc_id in candidates:
+            score = scores[doc_id]
+            if self.normalized_names[doc_id].startswith(normalized_query):
+                score += PREFIX_BONUS
+            results.append((score, int(doc_id)))
+        results.sort(key=lambda x: (-x[0], x[1]))
+
+        occupancy = self._occupancy_lookup(df_occupancy) if df_occupancy is not None else {}
+        hits = []
+        for score, doc_id in results[:k]:
+            hit = dict(self.records[doc_id])
+            hit['score'] = round(float(score), 3)
+            row = occupancy.get(hit['hospital_id'])
+            if row is not None:
+                hit['occupancy_rate'] = row.occupancy_rate
+                hit['status'] = row.status
+                hit['available_beds'] = row.available_beds
+                hit['wait_time'] = row.wait_time_minutes
+            hits.append(hit)
+        return hits
+
+
+if __name__ == "__main__":
+    import time
+
+    index = SearchIndex.load_or_build(ShardStore())
+    df_occupancy = pd.read_csv('Hospital_Occupancy_Current.csv')
+    query = ' '.join(sys.argv[1:]) or 'rs ciputra'
+
+    start = time.perf_counter()
+    hits = index.search(query, df_occupancy=df_occupancy)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"🔎 '{query}': {len(hits)} hasil dalam {elapsed:.2f} ms")
+    for hit in hits:
+        print(f"  {hit['score']:.2f}  [{hit['kind']}] {hit['nama']} - {hit['kab']}"
+              f"  {hit.get('status', '')} {hit.get('occupancy_rate', '')}")
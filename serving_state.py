@@ -0,0 +1,346 @@
+"""
+CrowdAID - Shared Serving State
+Data hospital, Faskes dan history occupancy, model Random Forest yang
+diratakan menjadi array node, serta matrix suitability/kontribusi ML
+dipublikasikan sekali sebagai file .npy. Setiap worker cukup memetakan
+file tersebut (np.load mmap_mode='r'): page dibagi lewat page cache OS,
+dan worker tidak perlu parse CSV, import sklearn, atau unpickle model.
+Array model dan kolom numerik tabel dipakai langsung dari mmap; kolom
+teks di-decode menjadi object per view yang di-load.
+
+Usage:
+    python serving_state.py        # publish ke serving_state/
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
+
+from ml_predictor import CrowdAIDPredictor, ForestExplainer
+from scoring import HospitalScorer
+from shard_store import ShardStore
+
+
+SERVING_ROOT = 'serving_state'
+CURRENT_NAME = 'current.json'
+STATE_VERSION = 1
+
+MODEL_FILES = ('model_random_forest.pkl', 'label_encoders.pkl', 'model_metadata.json')
+
+# Tabel shard yang dipublikasikan: nama tabel -> key manifest yang berisi shard-nya
+TABLES = {
+    'hospital': 'regions',
+    'faskes': 'faskes',
+    'occupancy_history': 'regions'
+}
+
+
+class FlatForest:
+    """
+    Random Forest sebagai array node (semua tree disambung)
+
+    Menggantikan model sklearn untuk inference: apply() menelusuri semua
+    tree sekaligus per level kedalaman, predict_proba() merata-rata
+    probability leaf (per kelas, urutan model.classes_) dengan urutan
+    penjumlahan yang sama seperti sklearn.
+    """
+
+    def __init__(self, left, right, feature, threshold, proba, roots, max_depth, classes):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.proba = proba
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+
+    ARRAYS = ('left', 'right', 'feature', 'threshold', 'proba', 'roots')
+
+    @classmethod
+    def from_sklearn(cls, model):
+        left, right, feature, threshold, proba, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_split = tree.children_left >= 0
+            left.append(np.where(is_split, tree.children_left + offset, -1))
+            right.append(np.where(is_split, tree.children_right + offset, -1))
+            feature.append(np.where(is_split, tree.feature, 0))
+            threshold.append(tree.threshold)
+            # Normalisasi sama seperti DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            proba.append(value / normalizer[:, None])
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        return cls(np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+                   np.concatenate(feature).astype(np.int32), np.concatenate(threshold),
+                   np.concatenate(proba), np.array(roots, dtype=np.int64), max_depth, model.classes_)
+
+    def _leaves(self, features):
+        X = np.asarray(features, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self.left[node]
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(left >= 0, np.where(go_left, left, self.right[node]), node)
+        return node
+
+    def apply(self, features):
+        """Index leaf per tree, relatif terhadap root tree (seperti sklearn)"""
+        return self._leaves(features) - self.roots
+
+    def predict_proba(self, features):
+        leaf_proba = self.proba[self._leaves(features)]
+        # Jumlahkan per tree berurutan, sama seperti sklearn (hasil bitwise sama)
+        total = np.zeros((len(leaf_proba), self.proba.shape[1]))
+        for t in range(leaf_proba.shape[1]):
+            total += leaf_proba[:, t]
+        return total / leaf_proba.shape[1]
+
+
+class LabelClasses:
+    """Pengganti LabelEncoder hasil fit (hanya classes_ dan transform)"""
+
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def transform(self, values):
+        values = np.asarray(values, dtype=str)
+        codes = np.searchsorted(self.classes_, values)
+        codes = np.clip(codes, 0, len(self.classes_) - 1)
+        unknown = self.classes_[codes] != values
+        if unknown.any():
+            raise ValueError(f"y contains previously unseen labels: {values[unknown].tolist()}")
+        return codes
+
+
+def _save_table(directory, name, df):
+    """Simpan DataFrame per kolom: numerik apa adanya, teks sebagai unicode fixed-width"""
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        path = f"{name}.{len(columns)}"
+        if values.dtype.kind in 'biuf':
+            np.save(os.path.join(directory, f"{path}.npy"), values.to_numpy())
+            columns[column] = {'file': path, 'text': False, 'nulls': False}
+            continue
+        nulls = values.isna().to_numpy()
+        np.save(os.path.join(directory, f"{path}.npy"),
+                np.where(nulls, '', values.astype(str)).astype(str))
+        if nulls.any():
+            np.save(os.path.join(directory, f"{path}.null.npy"), nulls)
+        columns[column] = {'file': path, 'text': True, 'nulls': bool(nulls.any())}
+    return columns
+
+
+def _publish_lock(root):
+    """File lock antar proses untuk publish; dipakai dengan `with`"""
+    os.makedirs(root, exist_ok=True)
+    lock = open(os.path.join(root, '.lock'), 'w')
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def publish(root=SERVING_ROOT, store=None):
+    """
+    Bangun serving state baru di root/<versi>/ lalu arahkan current.json ke
+    versi itu (atomik). Worker yang masih memetakan versi lama tidak
+    terganggu. Caller memegang _publish_lock(root).
+
+    Returns:
+        str - path direktori versi baru
+    """
+    store = store or ShardStore()
+    manifest = store.manifest
+    os.makedirs(root, exist_ok=True)
+    version = f"v{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    tmp_dir = os.path.join(root, f".tmp-{version}")
+    os.makedirs(tmp_dir)
+
+    meta = {'version': STATE_VERSION, 'tables': {}}
+    for table, manifest_key in TABLES.items():
+        frames, offsets, start = [], {}, 0
+        for key, entry in manifest[manifest_key].items():
+            path = entry['path'] if table == 'faskes' else entry[table]
+            if not path:
+                continue
+            df = pd.read_csv(os.path.join(store.root, path), sep=';' if table == 'hospital' else ',')
+            frames.append(df)
+            offsets[key] = [start, start + len(df)]
+            start += len(df)
+        df_table = pd.concat(frames, ignore_index=True) if frames else \
+            pd.DataFrame(columns=manifest['columns'][table])
+        meta['tables'][table] = {
+            'columns': _save_table(tmp_dir, table, df_table),
+            'offsets': offsets,
+            # dtype per shard, sama seperti pd.read_csv pada shard itu sendiri
+            'dtypes': {key: df.dtypes.astype(str).to_dict() for key, df in zip(offsets, frames)}
+        }
+
+    # Model: forest rata, kontribusi per node, encoder dan metadata
+    predictor = CrowdAIDPredictor()
+    forest = FlatForest.from_sklearn(predictor.model)
+    for name in FlatForest.ARRAYS:
+        np.save(os.path.join(tmp_dir, f"forest.{name}.npy"), getattr(forest, name))
+    np.save(os.path.join(tmp_dir, 'explainer.node_contributions.npy'), predictor.explainer.node_contributions)
+    np.save(os.path.join(tmp_dir, 'explainer.offsets.npy'), predictor.explainer.offsets)
+    meta['model'] = {
+        'max_depth': forest.max_depth,
+        'classes': forest.classes_.tolist(),
+        'bias': predictor.explainer.bias,
+        'metadata': predictor.metadata,
+        'encoders': {name: encoder.classes_.astype(str).tolist()
+                     for name, encoder in predictor.encoders.items()}
+    }
+
+    # Matrix ML untuk semua hospital, sehingga scorer worker siap tanpa inference
+    df_hospital = pd.concat([store.hospitals(kab) for kab in store.kabupaten_list()], ignore_index=True)
+    df_hospital = df_hospital.drop_duplicates('id')
+    np.save(os.path.join(tmp_dir, 'scorer.hospital_id.npy'), df_hospital['id'].to_numpy())
+    np.save(os.path.join(tmp_dir, 'scorer.suitability.npy'),
+            predictor.suitability_matrix(df_hospital).to_numpy())
+    np.save(os.path.join(tmp_dir, 'scorer.contributions.npy'),
+            predictor.contribution_matrix(df_hospital).to_numpy())
+
+    meta['sources'] = _sources(store)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+    version_dir = os.path.join(root, version)
+    os.rename(tmp_dir, version_dir)
+    current_tmp = os.path.join(root, f"{CURRENT_NAME}.tmp-{os.getpid()}")
+    with open(current_tmp, 'w') as f:
+        json.dump({'version_dir': version}, f)
+    os.replace(current_tmp, os.path.join(root, CURRENT_NAME))
+
+    # Versi lama dihapus best-effort; file yang masih di-mmap tetap valid
+    for entry in os.listdir(root):
+        if entry.startswith('v') and entry != version:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return version_dir
+
+
+def _sources(store):
+    sources = {'shards': store.manifest.get('sources', {}), 'state_version': STATE_VERSION}
+    sources['model'] = {path: os.stat(path).st_mtime for path in MODEL_FILES if os.path.exists(path)}
+    return sources
+
+
+class ServingState:
+    """
+    Serving state yang di-attach dari file .npy (read-only)
+
+    Array model dan scorer serta kolom numerik dari frame() adalah view ke
+    file yang di-mmap; kolom teks disalin menjadi object per slice.
+
+    Attributes:
+        predictor: CrowdAIDPredictor di atas FlatForest (tanpa sklearn)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        # Semua file dipetakan sekarang, sehingga versi ini tetap terbaca
+        # walaupun direktorinya dihapus setelah publish berikutnya
+        self._arrays = {
+            name[:-len('.npy')]: np.load(os.path.join(directory, name), mmap_mode='r')
+            for name in os.listdir(directory) if name.endswith('.npy')
+        }
+
+        model = self.meta['model']
+        forest = FlatForest(*[self._array(f"forest.{name}") for name in FlatForest.ARRAYS],
+                            max_depth=model['max_depth'], classes=model['classes'])
+        metadata = model['metadata']
+        explainer = ForestExplainer.from_arrays(forest, metadata['feature_columns'],
+                                                self._array('explainer.node_contributions'),
+                                                self._array('explainer.offsets'), model['bias'])
+        encoders = {name: LabelClasses(np.array(classes)) for name, classes in model['encoders'].items()}
+        self.predictor = CrowdAIDPredictor.from_parts(forest, encoders, metadata, explainer)
+
+    def _array(self, name):
+        return self._arrays[name]
+
+    @classmethod
+    def attach(cls, root=SERVING_ROOT):
+        with open(os.path.join(root, CURRENT_NAME)) as f:
+            current = json.load(f)
+        return cls(os.path.join(root, current['version_dir']))
+
+    @classmethod
+    def load_or_publish(cls, root=SERVING_ROOT, store=None):
+        """Attach ke versi terkini; publish ulang jika belum ada atau sumber berubah"""
+        store = store or ShardStore()
+        # Worker yang start bersamaan: hanya satu yang publish, sisanya attach
+        with _publish_lock(root):
+            try:
+                state = cls.attach(root)
+                if state.meta.get('sources') == json.loads(json.dumps(_sources(store))):
+                    return state
+            except (OSError, ValueError, KeyError):
+                pass
+            return cls(publish(root, store))
+
+    def frame(self, table, keys, columns=None):
+        """
+        DataFrame baris tabel untuk key manifest (region hospital atau
+        shard Faskes), dengan kolom dan dtype sama seperti CSV shard.
+        Kolom numerik read-only (view mmap), jangan dimodifikasi in-place.
+        """
+        info = self.meta['tables'][table]
+        frames = [self._slice(info, key) for key in keys if key in info['offsets']]
+        if not frames:
+            return pd.DataFrame(columns=columns if columns is not None else list(info['columns']))
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _slice(self, info, key):
+        start, stop = info['offsets'][key]
+        dtypes = info['dtypes'][key]
+        data = {}
+        for column, spec in info['columns'].items():
+            values = self._array(spec['file'])[start:stop]
+            if spec['text']:
+                values = values.astype(object)
+                if spec['nulls']:
+                    values[self._array(f"{spec['file']}.null")[start:stop]] = np.nan
+            if str(values.dtype) != dtypes[column]:
+                values = values.astype(dtypes[column])
+            data[column] = values
+        # copy=False: kolom numerik tetap view ke mmap (satu block per kolom)
+        return pd.DataFrame(data, columns=list(info['columns']), copy=False)
+
+    def scorer(self):
+        """HospitalScorer dengan matrix suitability/kontribusi yang sudah dipublikasikan"""
+        metadata = self.predictor.metadata
+        ids = self._array('scorer.hospital_id')
+        suitability = pd.DataFrame(self._array('scorer.suitability'), index=ids,
+                                   columns=metadata['conditions'], copy=False)
+        contributions = pd.DataFrame(
+            self._array('scorer.contributions'), index=ids, copy=False,
+            columns=pd.MultiIndex.from_product([metadata['conditions'], metadata['feature_columns']]))
+        scorer = HospitalScorer(self.predictor)
+        scorer.preload(suitability, contributions)
+        return scorer
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    with _publish_lock(SERVING_ROOT):
+        path = publish()
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f"✅ Serving state published to {path} ({size / 1024:.0f} KB) in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,311 @@
+"""
+CrowdAID - Sharded Data Store
+Data hospital, Faskes dan history occupancy dipartisi per provinsi dan
+kabupaten/kota di disk, dengan manifest kecil. Hanya shard yang di-query
+sebuah session yang di-load, dengan batas LRU untuk shard yang resident.
+
+Usage:
+    python shard_store.py        # build shards/ dari file CSV sumber
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
+
+
+SHARD_ROOT = 'shards'
+MANIFEST_NAME = 'manifest.json'
+# Versi layout shard; manifest versi lain dibangun ulang
+SHARD_VERSION = 2
+MAX_RESIDENT_SHARDS = 16
+
+HOSPITAL_PATH = 'Hospital_Banten.csv'
+FASKES_PATH = 'Faskes_BPJS_Banten_2019.csv'
+HISTORY_PATH = 'Hospital_Occupancy_3Weeks.csv'
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-')
+
+
+def _faskes_region(kotakab):
+    """'...BPJS di\\r\\n   Kab. Tangerang' -> 'Kab. Tangerang'"""
+    normalized = kotakab.str.replace(r'\s+', ' ', regex=True)
+    return normalized.str.extract(r'((?:Kab\.|Kota)\s+.+?)\s*$', expand=False)
+
+
+def _build_lock(root):
+    """File lock antar proses untuk build shard; dipakai dengan `with`"""
+    os.makedirs(root, exist_ok=True)
+    lock = open(os.path.join(root, '.lock'), 'w')
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def _read_manifest(root):
+    """Manifest saat ini, None jika belum ada atau dari layout lama"""
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == SHARD_VERSION else None
+
+
+def build_shards(root=SHARD_ROOT, hospital_path=HOSPITAL_PATH, faskes_path=FASKES_PATH,
+                 history_path=HISTORY_PATH):
+    """
+    Partisi file CSV sumber ke root/<versi>/ dan tulis manifest
+
+    Hospital dan history occupancy dipartisi per (provinsi, kab). Faskes
+    dipartisi per (provinsi, kab Faskes); manifest mencatat shard Faskes
+    mana yang cocok untuk setiap kab hospital dengan predikat yang sama
+    seperti filter di recommender (KotaKab mengandung nama kab).
+
+    Shard ditulis ke direktori sementara lalu di-rename ke direktori versi
+    baru; manifest.json diganti (atomik) paling akhir, sehingga pembaca
+    tidak pernah melihat shard yang setengah ditulis. Versi sebelumnya
+    disimpan untuk store yang masih memegang manifest lama. Caller memegang
+    _build_lock(root).
+
+    Returns:
+        dict manifest
+    """
+    df_hospital = pd.read_csv(hospital_path, sep=';')
+    df_faskes = pd.read_csv(faskes_path)
+    df_faskes['KotaKab_Clean'] = df_faskes['KotaKab'].str.extract(r'(Kab\.|Kota)\s+(.+?)(?:\r|$)', expand=False)[1]
+    df_faskes['KotaKab_Clean'] = df_faskes['KotaKab_Clean'].str.strip()
+    df_history = pd.read_csv(history_path) if os.path.exists(history_path) else None
+
+    os.makedirs(root, exist_ok=True)
+    data_dir = f"v{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    tmp_dir = os.path.join(root, f".tmp-{data_dir}")
+
+    def output(path):
+        # path relatif terhadap direktori versi; manifest mencatat path relatif terhadap root
+        full_path = os.path.join(tmp_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return full_path
+
+    manifest = {
+        'version': SHARD_VERSION,
+        'data_dir': data_dir,
+        'sources': {path: os.stat(path).st_mtime for path in (hospital_path, faskes_path, history_path)
+                    if os.path.exists(path)},
+        'columns': {
+            'hospital': df_hospital.columns.tolist(),
+            'faskes': df_faskes.columns.tolist(),
+            'occupancy_history': df_history.columns.tolist() if df_history is not None else []
+        },
+        'regions': {},
+        'faskes': {},
+        'unassigned_history': None
+    }
+
+    # Faskes shards, in order of first appearance in the source file
+    faskes_region = _faskes_region(df_faskes['KotaKab']).fillna('Lainnya')
+    faskes_groups = {}
+    for (province, region), group in df_faskes.groupby([df_faskes['Provinsi'], faskes_region], sort=False):
+        key = f"{province}/{region}"
+        path = os.path.join('faskes', slugify(province), f"{slugify(region)}.csv")
+        group.to_csv(output(path), index=False)
+        faskes_groups[key] = group
+        manifest['faskes'][key] = {'province': province, 'region': region,
+                                   'path': os.path.join(data_dir, path), 'rows': len(group)}
+
+    # Hospital + occupancy history shards
+    for (province, kab), group in df_hospital.groupby(['propinsi', 'kab'], sort=True):
+        key = f"{province}/{kab}"
+        region_dir = os.path.join('hospital', slugify(province), slugify(kab))
+
+        hospital_file = os.path.join(region_dir, 'hospital.csv')
+        group.to_csv(output(hospital_file), sep=';', index=False)
+
+        history_file = None
+        if df_history is not None:
+            history = df_history[df_history['hospital_id'].isin(group['id'])]
+            history_file = os.path.join(region_dir, 'occupancy_history.csv')
+            history.to_csv(output(history_file), index=False)
+
+        covered = [
+            faskes_key for faskes_key, faskes in faskes_groups.items()
+            if faskes['KotaKab'].str.contains(kab, case=False, na=False).any()
+        ]
+
+        manifest['regions'][key] = {
+            'province': province,
+            'kab': kab,
+            'hospital': os.path.join(data_dir, hospital_file),
+            'occupancy_history': os.path.join(data_dir, history_file) if history_file else None,
+            'faskes': covered,
+            'hospitals': len(group),
+            'kelas': group['kelas'].value_counts().sort_index().to_dict()
+        }
+
+    # History untuk hospital_id yang tidak ada di data hospital tetap disimpan
+    if df_history is not None:
+        unassigned = df_history[~df_history['hospital_id'].isin(df_hospital['id'])]
+        if len(unassigned):
+            history_file = os.path.join('hospital', '_unassigned', 'occupancy_history.csv')
+            unassigned.to_csv(output(history_file), index=False)
+            manifest['unassigned_history'] = os.path.join(data_dir, history_file)
+
+    previous = _read_manifest(root)
+    os.makedirs(tmp_dir, exist_ok=True)
+    os.rename(tmp_dir, os.path.join(root, data_dir))
+    manifest_tmp = os.path.join(root, f"{MANIFEST_NAME}.tmp-{os.getpid()}")
+    with open(manifest_tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(manifest_tmp, os.path.join(root, MANIFEST_NAME))
+
+    # Hapus versi lain (termasuk layout lama dan build yang terputus),
+    # kecuali versi sebelumnya yang mungkin masih dibaca store lain
+    keep = {data_dir, previous['data_dir'] if previous else None}
+    for entry in os.listdir(root):
+        if entry not in keep and os.path.isdir(os.path.join(root, entry)):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return manifest
+
+
+class ShardStore:
+    """
+    Lazy per-region loader di atas manifest
+
+    View per kabupaten/kota (hospital, Faskes, history) di-load saat pertama
+    kali di-query dan disimpan di cache LRU (maksimal max_resident view).
+    DataFrame yang dikembalikan dibagi antar session, jangan dimodifikasi
+    in-place. Jika `shared` (serving_state.ServingState) diberikan, view
+    dibangun dari array yang di-mmap bersama antar worker, bukan dari CSV.
+    """
+
+    def __init__(self, root=SHARD_ROOT, max_resident=MAX_RESIDENT_SHARDS, shared=None):
+        self.root = root
+        self.max_resident = max_resident
+        self.shared = shared
+        self.manifest = _read_manifest(root)
+        if self.manifest is None or self._sources_changed():
+            # Worker yang start bersamaan: hanya satu yang build, sisanya
+            # memakai manifest hasil build itu
+            with _build_lock(root):
+                self.manifest = _read_manifest(root)
+                if self.manifest is None or self._sources_changed():
+                    self.manifest = build_shards(root)
+
+        self._regions_by_kab = {}
+        for key, region in self.manifest['regions'].items():
+            self._regions_by_kab.setdefault(region['kab'], []).append(key)
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key, build):
+        with self._lock:
+            df = self._cache.get(key)
+            if df is not None:
+                self._cache.move_to_end(key)
+                return df
+
+        df = build()
+
+        with self._lock:
+            self._cache[key] = df
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_resident:
+                self._cache.popitem(last=False)
+        return df
+
+    def _read(self, paths, columns, sep=','):
+        frames = [pd.read_csv(os.path.join(self.root, path), sep=sep) for path in paths]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _load(self, table, keys, paths, columns, sep=','):
+        if self.shared is not None:
+            return lambda: self.shared.frame(table, keys, columns)
+        return lambda: self._read(paths, columns, sep=sep)
+
+    def _sources_changed(self):
+        """True jika file CSV sumber (jika masih ada) lebih baru dari shard"""
+        for path, mtime in self.manifest.get('sources', {}).items():
+            if os.path.exists(path) and os.stat(path).st_mtime != mtime:
+                return True
+        return False
+
+    @property
+    def history_version(self):
+        """mtime file history sumber saat shard dibuat, None jika tidak ada history"""
+        return self.manifest.get('sources', {}).get(HISTORY_PATH)
+
+    @property
+    def resident_shards(self):
+        return list(self._cache.keys())
+
+    def kabupaten_list(self):
+        return sorted(self._regions_by_kab)
+
+    def _regions(self, kab):
+        return [self.manifest['regions'][key] for key in self._regions_by_kab.get(kab, [])]
+
+    def hospital_count(self, kelas=None):
+        """Jumlah hospital dari manifest, tanpa load shard"""
+        regions = self.manifest['regions'].values()
+        if kelas is None:
+            return sum(region['hospitals'] for region in regions)
+        return sum(region['kelas'].get(kelas, 0) for region in regions)
+
+    def hospitals(self, kab):
+        """DataFrame hospital untuk satu kabupaten/kota"""
+        keys = self._regions_by_kab.get(kab, [])
+        paths = [region['hospital'] for region in self._regions(kab)]
+        columns = self.manifest['columns']['hospital']
+        return self._cached(('hospital', kab), self._load('hospital', keys, paths, columns, sep=';'))
+
+    def faskes(self, kab):
+        """DataFrame Faskes yang relevan untuk satu kabupaten/kota"""
+        keys = []
+        for region in self._regions(kab):
+            keys.extend(key for key in region['faskes'] if key not in keys)
+        paths = [self.manifest['faskes'][key]['path'] for key in keys]
+        columns = self.manifest['columns']['faskes']
+        return self._cached(('faskes', kab), self._load('faskes', keys, paths, columns))
+
+    def occupancy_history(self, kab):
+        """History occupancy hospital di satu kabupaten/kota"""
+        keys = [key for key in self._regions_by_kab.get(kab, [])
+                if self.manifest['regions'][key]['occupancy_history']]
+        paths = [self.manifest['regions'][key]['occupancy_history'] for key in keys]
+        columns = self.manifest['columns']['occupancy_history']
+        return self._cached(('occupancy_history', kab), self._load('occupancy_history', keys, paths, columns))
+
+    def iter_occupancy_history(self):
+        """
+        History occupancy semua region, satu shard per kali dan dibaca
+        langsung (tidak lewat cache LRU), untuk warm-up rollups/detector
+        tanpa memuat seluruh history sekaligus
+        """
+        columns = self.manifest['columns']['occupancy_history']
+        for key, region in self.manifest['regions'].items():
+            if region['occupancy_history']:
+                yield self._load('occupancy_history', [key], [region['occupancy_history']], columns)()
+        unassigned = self.manifest.get('unassigned_history')
+        if unassigned:
+            yield self._read([unassigned], columns)
+
+if __name__ == "__main__":
+    with _build_lock(SHARD_ROOT):
+        manifest = build_shards()
+    print(f"✅ {len(manifest['regions'])} hospital regions, {len(manifest['faskes'])} Faskes shards "
+          f"written to {SHARD_ROOT}/")
@@ -0,0 +1,425 @@
+"""
+CrowdAID - Routing Policy Simulator
+Discrete-event simulation: history occupancy 3 minggu di-replay sebagai
+beban latar, pasien datang per kondisi dan urgensi, lalu dirutekan lewat
+recommender.get_recommendations dengan policy (ambang smart suggestion)
+alternatif. Hasil: waktu tunggu dan overcrowding per policy.
+
+Usage:
+    python simulator.py                                  # semua policy, 4 seed
+    python simulator.py --policies baseline kelas_c_40 --seeds 8
+    python simulator.py --arrival-rate 30 --compliance 0.7 --workers 4
+
+Output:
+    - simulation_results/<timestamp>_runs.csv      # satu baris per (policy, seed)
+    - simulation_results/<timestamp>_summary.csv   # rata-rata per policy
+"""
+
+import argparse
+import heapq
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from occupancy_refresher import SNAPSHOT_HOURS
+from patient_mix import KONDISI_MIX, URGENCY_MIX
+from recommender import (DEFAULT_POLICY, GIGI_SUGGESTION, KELAS_C_SUGGESTION, NEIGHBOURS,
+                         SPESIALIS_SUGGESTION, get_recommendations, merge_occupancy)
+from shard_store import ShardStore
+
+
+RESULTS_DIR = 'simulation_results'
+
+# Policy alternatif (override DEFAULT_POLICY). Rasio 1.0 berarti saran
+# tidak pernah muncul.
+POLICIES = {
+    'baseline': {},
+    'no_suggestions': {'kelas_c_full_ratio': 1.0, 'kelas_b_busy_ratio': 1.0},
+    'kelas_c_40': {'kelas_c_full_ratio': 0.4},
+    'kelas_c_80': {'kelas_c_full_ratio': 0.8},
+    'kelas_b_80_40': {'kelas_b_busy_occupancy': 80, 'kelas_b_busy_ratio': 0.4},
+    'kelas_b_90_60': {'kelas_b_busy_occupancy': 90, 'kelas_b_busy_ratio': 0.6},
+}
+
+# Pasien per jam (seluruh Banten) dan pola harian kedatangan
+ARRIVAL_RATE = 20.0
+HOURLY_PROFILE = np.array([0.4, 0.3, 0.3, 0.3, 0.4, 0.6, 0.9, 1.3, 1.5, 1.5, 1.4, 1.3,
+                           1.2, 1.2, 1.2, 1.1, 1.1, 1.2, 1.2, 1.1, 1.0, 0.8, 0.6, 0.5])
+HOURLY_PROFILE = HOURLY_PROFILE / HOURLY_PROFILE.mean()
+
+# Rata-rata lama rawat (jam) per kondisi, distribusi eksponensial
+LENGTH_OF_STAY_HOURS = {
+    "1": 4, "2": 72, "3": 96, "4": 48, "5": 48, "6": 2, "7": 120
+}
+
+# Peluang pasien non-darurat mengikuti smart suggestion
+COMPLIANCE = 0.5
+
+# Saran menunda Kelas B: datang lagi besok pagi 07:00-09:00
+DEFER_HOUR = 7
+DEFER_WINDOW_HOURS = 2
+
+# Metrik hanya dihitung setelah pasien simulasi mengisi bed
+WARMUP_HOURS = 72
+
+# Batas status dan waktu tunggu per occupancy, sesuai band di data
+# occupancy (TERSEDIA < 50 < NORMAL < 70 < SIBUK < 85 < HAMPIR PENUH < 95)
+STATUS_BANDS = [(95, 'PENUH'), (85, 'HAMPIR PENUH'), (70, 'SIBUK'), (50, 'NORMAL')]
+WAIT_OCCUPANCY = [0, 50, 70, 85, 95, 100]
+WAIT_MINUTES = [15, 30, 60, 120, 180, 300]
+
+
+def status_for(occupancy):
+    occupancy = np.asarray(occupancy, dtype=float)
+    return np.select([occupancy >= bound for bound, _ in STATUS_BANDS],
+                     [status for _, status in STATUS_BANDS], 'TERSEDIA')
+
+
+def wait_for(occupancy):
+    return np.interp(occupancy, WAIT_OCCUPANCY, WAIT_MINUTES)
+
+
+class World:
+    """
+    Input simulasi yang read-only dan dipakai bersama oleh semua run dalam
+    satu proses: hospital per kabupaten, Faskes, beban latar dari history,
+    dan scorer ML
+    """
+
+    def __init__(self, use_model=True):
+        store = ShardStore()
+        self.kabupaten = store.kabupaten_list()
+        self.df_hospital = pd.concat([store.hospitals(kab) for kab in self.kabupaten],
+                                     ignore_index=True)
+        self.faskes = {kab: store.faskes(kab) for kab in self.kabupaten}
+        self.kab_weights = np.array([len(store.hospitals(kab)) for kab in self.kabupaten], dtype=float)
+        self.kab_weights /= self.kab_weights.sum()
+
+        ids = self.df_hospital['id'].to_numpy()
+        self.slot = {hospital_id: i for i, hospital_id in enumerate(ids)}
+        self.kab_of = self.df_hospital['kab'].to_numpy()
+
+        # Beban latar: bed terisi per snapshot x hospital, dari shard history per region
+        history = pd.concat([df_history[['timestamp', 'hospital_id', 'occupied_beds', 'total_beds']]
+                             for df_history in store.iter_occupancy_history()], ignore_index=True)
+        history['timestamp'] = pd.to_datetime(history['timestamp'])
+        occupied = history.pivot_table(index='timestamp', columns='hospital_id',
+                                       values='occupied_beds', aggfunc='last').reindex(columns=ids)
+        total = history.groupby('hospital_id')['total_beds'].last().reindex(ids)
+        total = total.fillna(self.df_hospital.set_index('id')['total_tempat_tidur'].reindex(ids))
+        self.total_beds = np.maximum(total.to_numpy(dtype=float), 1)
+        # Hospital tanpa history: asumsi occupancy 75% (sama dengan merge_occupancy)
+        self.background = occupied.fillna(pd.Series(self.total_beds * 0.75, index=ids)).to_numpy(dtype=float)
+        self.start = occupied.index[0]
+        self.snapshot_hours = ((occupied.index - self.start) / pd.Timedelta(hours=1)).to_numpy(dtype=float)
+        self.horizon = self.snapshot_hours[-1] + SNAPSHOT_HOURS
+
+        # Template df_merged per kabupaten; kolom occupancy diisi ulang
+        # dari state simulasi setiap kali pasien datang
+        empty = pd.DataFrame(columns=['hospital_id', 'occupancy_rate', 'status', 'available_beds',
+                                      'wait_time_minutes'])
+        self.templates = {}
+        for kab in self.kabupaten:
+            df_merged = merge_occupancy(store.hospitals(kab), empty)
+            slots = np.array([self.slot[hospital_id] for hospital_id in df_merged['id']], dtype=np.int64)
+            self.templates[kab] = (df_merged, slots)
+
+        self.scorer = None
+        if use_model:
+            try:
+                from ml_predictor import CrowdAIDPredictor
+                from scoring import HospitalScorer
+                self.scorer = HospitalScorer(CrowdAIDPredictor(), self.df_hospital)
+            except Exception as e:
+                print(f"⚠️ ML model tidak tersedia, ranking rule-based: {e}")
+
+
+class Simulation:
+    """
+    Satu run simulasi untuk satu policy dan satu seed
+
+    Event (heap): snapshot beban latar, kedatangan pasien, dan pasien
+    pulang. Pasien yang tidak mendapat bed antre FIFO di hospital tujuan
+    sampai ada bed kosong.
+    """
+
+    SNAPSHOT, ARRIVAL, DISCHARGE = 0, 1, 2
+
+    def __init__(self, world, policy, seed, arrival_rate=ARRIVAL_RATE, compliance=COMPLIANCE,
+                 warmup_hours=WARMUP_HOURS):
+        self.world = world
+        self.policy = {**DEFAULT_POLICY, **policy}
+        self.rng = np.random.default_rng(seed)
+        self.arrival_rate = arrival_rate
+        self.compliance = compliance
+        self.warmup = warmup_hours
+
+        n = len(world.total_beds)
+        self.background = world.background[0].copy()
+        self.patients = np.zeros(n)
+        self.queues = [deque() for _ in range(n)]
+        self.last_change = np.zeros(n)
+        self.occupancy_hours = np.zeros(n)
+        self.penuh_hours = np.zeros(n)
+        self.overflow_hours = np.zeros(n)
+        self.peak_occupancy = np.zeros(n)
+
+        self.events = []
+        self._seq = 0
+        self.counts = dict.fromkeys(['arrivals', 'faskes', 'admitted', 'queued', 'deferred',
+                                     'rerouted', 'unserved'], 0)
+        self.waits = []
+        self.queue_waits = []
+        self.defer_hours = []
+
+    def _push(self, t, kind, payload=None):
+        self._seq += 1
+        heapq.heappush(self.events, (t, self._seq, kind, payload))
+
+    def occupancy(self, slots=slice(None)):
+        return (self.background[slots] + self.patients[slots]) / self.world.total_beds[slots] * 100
+
+    def _advance(self, slots, t):
+        """Integrasikan occupancy hospital slots dari perubahan terakhir sampai t"""
+        start = np.maximum(self.last_change[slots], self.warmup)
+        dt = np.clip(t - start, 0, None)
+        rate = self.occupancy(slots)
+        self.occupancy_hours[slots] += rate * dt
+        self.penuh_hours[slots] += np.where(rate >= 95, dt, 0)
+        self.overflow_hours[slots] += np.where(rate > 100, dt, 0)
+        self.peak_occupancy[slots] = np.maximum(self.peak_occupancy[slots], np.where(dt > 0, rate, 0))
+        self.last_change[slots] = t
+
+    def _schedule_arrivals(self):
+        hours = int(np.ceil(self.world.horizon))
+        hour_of_day = (self.world.start.hour + np.arange(hours)) % 24
+        counts = self.rng.poisson(self.arrival_rate * HOURLY_PROFILE[hour_of_day])
+        times = np.repeat(np.arange(hours), counts) + self.rng.random(counts.sum())
+        n = len(times)
+        kab = self.rng.choice(len(self.world.kabupaten), size=n, p=self.world.kab_weights)
+        kondisi = self.rng.choice(list(KONDISI_MIX), size=n, p=list(KONDISI_MIX.values()))
+        urgency = self.rng.choice(list(URGENCY_MIX), size=n, p=list(URGENCY_MIX.values()))
+        for t, k, c, u in zip(times, kab, kondisi, urgency):
+            if t < self.world.horizon:
+                self._push(t, self.ARRIVAL, {'kab': self.world.kabupaten[k], 'kondisi': c,
+                                             'urgency': u, 'first_arrival': t})
+
+    def _recommend(self, kab, kondisi, urgency):
+        df_merged, slots = self.world.templates[kab]
+        occupancy = np.minimum(self.occupancy(slots), 100)
+        df_merged['occupancy_rate'] = occupancy
+        df_merged['status'] = status_for(occupancy)
+        df_merged['available_beds'] = np.floor(np.maximum(
+            self.world.total_beds[slots] - self.background[slots] - self.patients[slots], 0))
+        df_merged['wait_time_minutes'] = wait_for(occupancy).astype(np.int64)
+        return get_recommendations(df_merged, self.world.faskes[kab], kab, kondisi, urgency,
+                                   scorer=self.world.scorer, policy=self.policy)
+
+    @staticmethod
+    def _target(result):
+        """hospital_id rekomendasi teratas, None jika Faskes/tidak ada"""
+        if len(result.recs) == 0:
+            return None
+        top = result.recs['hospital_id'].iat[0]
+        return None if pd.isna(top) else top
+
+    def _route(self, t, patient):
+        kab, kondisi, urgency = patient['kab'], patient['kondisi'], patient['urgency']
+        result = self._recommend(kab, kondisi, urgency)
+        suggestion = result.smart_suggestion
+        complies = urgency != "Darurat" and self.rng.random() < self.compliance
+
+        if complies and suggestion == SPESIALIS_SUGGESTION and 'deferred' not in patient:
+            day = np.floor((t + self.world.start.hour) / 24) + 1
+            retry = day * 24 - self.world.start.hour + DEFER_HOUR + self.rng.random() * DEFER_WINDOW_HOURS
+            if retry < self.world.horizon:
+                self._count(t, 'deferred')
+                self._push(retry, self.ARRIVAL, {**patient, 'deferred': True})
+                return
+
+        if complies and suggestion == GIGI_SUGGESTION:
+            self._count(t, 'faskes')
+            return
+
+        target = self._target(result)
+        if complies and suggestion == KELAS_C_SUGGESTION:
+            # Pilih hospital teratas di kabupaten tetangga dengan occupancy terendah
+            best = None
+            for neighbour in NEIGHBOURS.get(kab, []):
+                candidate = self._target(self._recommend(neighbour, kondisi, urgency))
+                if candidate is None:
+                    continue
+                rate = self.occupancy(self.world.slot[candidate])
+                if best is None or rate < best[0]:
+                    best = (rate, candidate)
+            if best is not None and (target is None or best[0] < self.occupancy(self.world.slot[target])):
+                target = best[1]
+                self._count(t, 'rerouted')
+
+        if target is None:
+            self._count(t, 'faskes' if len(result.recs) else 'unserved')
+            return
+        self._admit_or_queue(t, self.world.slot[target], patient)
+
+    def _count(self, t, key):
+        if t >= self.warmup:
+            self.counts[key] += 1
+
+    def _has_bed(self, slot):
+        return self.background[slot] + self.patients[slot] < self.world.total_beds[slot]
+
+    def _admit(self, t, slot, patient, queued_hours=0.0):
+        self._advance(slot, t)
+        self.patients[slot] += 1
+        stay = self.rng.exponential(LENGTH_OF_STAY_HOURS[patient['kondisi']])
+        self._push(t + stay, self.DISCHARGE, slot)
+        if patient['first_arrival'] >= self.warmup:
+            self.counts['admitted'] += 1
+            self.waits.append(patient['wait_minutes'] + queued_hours * 60)
+            self.queue_waits.append(queued_hours * 60)
+            if patient.get('deferred'):
+                self.defer_hours.append(t - queued_hours - patient['first_arrival'])
+
+    def _admit_or_queue(self, t, slot, patient):
+        patient = {**patient, 'wait_minutes': float(wait_for(min(self.occupancy(slot), 100)))}
+        if self._has_bed(slot) and not self.queues[slot]:
+            self._admit(t, slot, patient)
+        else:
+            self._count(t, 'queued')
+            self.queues[slot].append((t, patient))
+
+    def _drain(self, t, slot):
+        queue = self.queues[slot]
+        while queue and self._has_bed(slot):
+            queued_at, patient = queue.popleft()
+            self._admit(t, slot, patient, queued_hours=t - queued_at)
+
+    def run(self):
+        for i, t in enumerate(self.world.snapshot_hours):
+            self._push(t, self.SNAPSHOT, i)
+        self._schedule_arrivals()
+
+        all_slots = np.arange(len(self.patients))
+        while self.events:
+            t, _, kind, payload = heapq.heappop(self.events)
+            if t >= self.world.horizon:
+                break
+            if kind == self.SNAPSHOT:
+                self._advance(all_slots, t)
+                self.background = self.world.background[payload].copy()
+                for slot in all_slots:
+                    if self.queues[slot]:
+                        self._drain(t, slot)
+            elif kind == self.ARRIVAL:
+                if 'deferred' not in payload:
+                    self._count(t, 'arrivals')
+                self._route(t, payload)
+            else:
+                self._advance(payload, t)
+                self.patients[payload] -= 1
+                self._drain(t, payload)
+        self._advance(all_slots, self.world.horizon)
+        return self.metrics()
+
+    def metrics(self):
+        hours = max(self.world.horizon - self.warmup, 1e-9)
+        waits = np.asarray(self.waits)
+        queue_waits = np.asarray(self.queue_waits)
+        still_queued = sum(len(queue) for queue in self.queues)
+        n_hospitals = len(self.patients)
+        return {
+            **self.counts,
+            'still_queued': still_queued,
+            'wait_mean': float(waits.mean()) if len(waits) else np.nan,
+            'wait_p50': float(np.percentile(waits, 50)) if len(waits) else np.nan,
+            'wait_p95': float(np.percentile(waits, 95)) if len(waits) else np.nan,
+            'wait_over_2h': float((waits > 120).mean()) if len(waits) else np.nan,
+            'bed_queue_mean': float(queue_waits.mean()) if len(queue_waits) else np.nan,
+            'defer_hours_mean': float(np.mean(self.defer_hours)) if self.defer_hours else 0.0,
+            'occupancy_mean': float(self.occupancy_hours.sum() / (hours * n_hospitals)),
+            'penuh_hospital_hours': float(self.penuh_hours.sum()),
+            'overflow_hospital_hours': float(self.overflow_hours.sum()),
+            'peak_occupancy': float(self.peak_occupancy.max()),
+        }
+
+
+# World per proses worker, di-load sekali oleh initializer pool
+_world = None
+
+
+def _init_worker(use_model):
+    global _world
+    _world = World(use_model=use_model)
+
+
+def _run_one(task):
+    policy_name, seed, arrival_rate, compliance = task
+    start = time.perf_counter()
+    metrics = Simulation(_world, POLICIES[policy_name], seed, arrival_rate=arrival_rate,
+                         compliance=compliance).run()
+    return {'policy': policy_name, 'seed': seed, **metrics,
+            'runtime_seconds': round(time.perf_counter() - start, 2)}
+
+
+def sweep(policies=None, seeds=4, arrival_rate=ARRIVAL_RATE, compliance=COMPLIANCE, workers=None,
+          use_model=True):
+    """
+    Jalankan semua kombinasi policy x seed di process pool
+
+    Returns:
+        (runs DataFrame, summary DataFrame rata-rata per policy)
+    """
+    policies = list(policies or POLICIES)
+    unknown = [name for name in policies if name not in POLICIES]
+    if unknown:
+        raise ValueError(f"Unknown policy: {', '.join(unknown)}")
+
+    tasks = [(name, seed, arrival_rate, compliance) for seed in range(seeds) for name in policies]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(use_model,)) as pool:
+        runs = pd.DataFrame(list(pool.map(_run_one, tasks)))
+
+    runs = runs.sort_values(['policy', 'seed'], kind='mergesort').reset_index(drop=True)
+    summary = runs.drop(columns=['seed']).groupby('policy', sort=False).mean().reindex(policies)
+    return runs, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CrowdAID routing policy simulator")
+    parser.add_argument('--policies', nargs='+', choices=list(POLICIES), help="default: semua policy")
+    parser.add_argument('--seeds', type=int, default=4)
+    parser.add_argument('--arrival-rate', type=float, default=ARRIVAL_RATE, help="pasien per jam")
+    parser.add_argument('--compliance', type=float, default=COMPLIANCE,
+                        help="peluang pasien non-darurat mengikuti smart suggestion")
+    parser.add_argument('--workers', type=int, help="jumlah proses (default: jumlah CPU)")
+    parser.add_argument('--no-model', action='store_true', help="ranking rule-based tanpa ML scorer")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    runs, summary = sweep(args.policies, seeds=args.seeds, arrival_rate=args.arrival_rate,
+                          compliance=args.compliance, workers=args.workers, use_model=not args.no_model)
+
+    print("=" * 70)
+    print(f"CrowdAID POLICY SIMULATION - {len(runs)} runs in {time.perf_counter() - start:.0f}s")
+    print("=" * 70)
+    columns = ['arrivals', 'admitted', 'deferred', 'rerouted', 'wait_mean', 'wait_p95', 'wait_over_2h',
+               'bed_queue_mean', 'occupancy_mean', 'penuh_hospital_hours', 'overflow_hospital_hours']
+    print(summary[columns].round(2).to_string())
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        prefix = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}")
+        runs.to_csv(f"{prefix}_runs.csv", index=False)
+        summary.to_csv(f"{prefix}_summary.csv")
+        print(f"\n✅ Saved: {prefix}_runs.csv, {prefix}_summary.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+CrowdAID - Surge Detector
+Deteksi lonjakan occupancy secara online: per hospital disimpan running
+mean/variance (Welford) dari perubahan occupancy antar snapshot dan EWMA
+trend, di-update O(1) per baris snapshot
+
+Usage:
+    python surge_detector.py     # warm-up dari history dan tampilkan alert
+"""
+
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
+
+from shard_store import ShardStore
+
+
+STATE_PATH = 'surge_detector.pkl'
+ALERT_LOG_PATH = 'surge_alerts.csv'
+
+# Minimal jumlah perubahan yang diamati sebelum z-score dipercaya
+MIN_SAMPLES = 10
+# Lonjakan satu snapshot: perubahan >= Z_THRESHOLD std di atas rata-rata
+Z_THRESHOLD = 3.0
+# Lonjakan bertahap: EWMA trend >= TREND_Z_THRESHOLD std (EWMA) di atas rata-rata
+TREND_Z_THRESHOLD = 2.5
+EWMA_ALPHA = 0.3
+# Jangan flag kenaikan yang masih jauh dari penuh
+MIN_ALERT_OCCUPANCY = 70.0
+
+ALERT_COLUMNS = ['timestamp', 'hospital_id', 'hospital_name', 'location', 'occupancy_rate',
+                 'delta', 'z_score', 'trend', 'trend_z', 'reason']
+
+
+class SurgeDetector:
+    """
+    Online surge detector per hospital
+
+    State disimpan dalam array sejajar (satu slot per hospital) sehingga
+    satu snapshot di-proses dengan operasi array tanpa loop per baris.
+    `flagged` adalah frozenset hospital_id yang snapshot terakhirnya
+    memicu alert; di-swap secara atomik setiap update.
+    """
+
+    def __init__(self, alert_log_path=ALERT_LOG_PATH):
+        self.alert_log_path = alert_log_path
+        self.slot = {}
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.trend = np.zeros(0)
+        self.last_occupancy = np.full(0, np.nan)
+        self.watermark = None
+        self.history_mtime = None
+        self.flagged = frozenset()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _slots_for(self, hospital_ids):
+        slots = np.empty(len(hospital_ids), dtype=np.int64)
+        for i, hospital_id in enumerate(hospital_ids):
+            slot = self.slot.get(hospital_id)
+            if slot is None:
+                slot = len(self.slot)
+                self.slot[hospital_id] = slot
+            slots[i] = slot
+
+        grow = len(self.slot) - len(self.count)
+        if grow > 0:
+            self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+            self.mean = np.concatenate([self.mean, np.zeros(grow)])
+            self.m2 = np.concatenate([self.m2, np.zeros(grow)])
+            self.trend = np.concatenate([self.trend, np.zeros(grow)])
+            self.last_occupancy = np.concatenate([self.last_occupancy, np.full(grow, np.nan)])
+        return slots
+
+    def _update_snapshot(self, rows):
+        """
+        Update state dengan satu snapshot (satu baris per hospital)
+
+        Returns:
+            DataFrame alert untuk snapshot ini (bisa kosong)
+        """
+        rows = rows.drop_duplicates('hospital_id', keep='last')
+        slots = self._slots_for(rows['hospital_id'].tolist())
+        occupancy = rows['occupancy_rate'].to_numpy(dtype=float)
+
+        delta = occupancy - self.last_occupancy[slots]
+        has_delta = ~np.isnan(delta)
+        s, d = slots[has_delta], delta[has_delta]
+
+        # Z-score terhadap statistik sebelum update ini
+        count = self.count[s]
+        std = np.sqrt(self.m2[s] / np.maximum(count - 1, 1))
+        warmed = (count >= MIN_SAMPLES) & (std > 0)
+        safe_std = np.where(std > 0, std, 1.0)
+        z_score = np.where(warmed, (d - self.mean[s]) / safe_std, 0.0)
+
+        trend = EWMA_ALPHA * d + (1 - EWMA_ALPHA) * self.trend[s]
+        ewma_std = safe_std * np.sqrt(EWMA_ALPHA / (2 - EWMA_ALPHA))
+        trend_z = np.where(warmed, (trend - self.mean[s]) / ewma_std, 0.0)
+
+        # Welford update
+        count = count + 1
+        step = d - self.mean[s]
+        self.mean[s] += step / count
+        self.m2[s] += step * (d - self.mean[s])
+        self.count[s] = count
+        self.trend[s] = trend
+        self.last_occupancy[slots] = occupancy
+
+        high = occupancy[has_delta] >= MIN_ALERT_OCCUPANCY
+        spike = warmed & high & (z_score >= Z_THRESHOLD)
+        climb = warmed & high & (trend_z >= TREND_Z_THRESHOLD) & (d > 0)
+        alert = spike | climb
+
+        flagged_rows = rows[has_delta][alert]
+        self.flagged = frozenset(flagged_rows['hospital_id'].tolist())
+        return pd.DataFrame({
+            'timestamp': flagged_rows['timestamp'].to_numpy(),
+            'hospital_id': flagged_rows['hospital_id'].to_numpy(),
+            'hospital_name': flagged_rows['hospital_name'].to_numpy(),
+            'location': flagged_rows['location'].to_numpy(),
+            'occupancy_rate': occupancy[has_delta][alert],
+            'delta': d[alert],
+            'z_score': z_score[alert].round(2),
+            'trend': trend[alert].round(2),
+            'trend_z': trend_z[alert].round(2),
+            'reason': np.where(spike[alert], 'spike', 'climb')
+        }, columns=ALERT_COLUMNS)
+
+    def update(self, df_occupancy, log_alerts=True):
+        """
+        Proses baris occupancy yang lebih baru dari watermark, snapshot
+        demi snapshot sesuai urutan timestamp
+
+        Returns:
+            DataFrame semua alert baru
+        """
+        with self._lock:
+            # Cek watermark di dalam lock: snapshot yang sama tidak di-update dua kali
+            alerts, latest = self._update(df_occupancy, self.watermark)
+            if latest is not None:
+                self.watermark = latest
+
+        if log_alerts and len(alerts):
+            self.log_alerts(alerts)
+        return alerts
+
+    def warm_up(self, frames):
+        """
+        Update dari history yang dipartisi (mis. satu shard per region)
+
+        State setiap hospital independen, sehingga hasilnya sama dengan
+        update() atas gabungan semua frame; `flagged` diambil dari snapshot
+        terakhir. Alert tidak ditulis ke log.
+
+        Returns:
+            DataFrame semua alert baru, urut timestamp
+        """
+        alerts, last_flagged = [], {}
+        with self._lock:
+            since = self.watermark
+            for df_history in frames:
+                frame_alerts, latest = self._update(df_history, since)
+                if latest is None:
+                    continue
+                alerts.append(frame_alerts)
+                last_flagged.setdefault(latest, set()).update(self.flagged)
+                if self.watermark is None or latest > self.watermark:
+                    self.watermark = latest
+            if last_flagged:
+                self.flagged = frozenset(last_flagged[max(last_flagged)])
+
+        if not alerts:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        alerts = pd.concat(alerts, ignore_index=True)
+        order = np.argsort(pd.to_datetime(alerts['timestamp'], errors='coerce').to_numpy(), kind='stable')
+        return alerts.iloc[order].reset_index(drop=True)
+
+    def _update(self, df_occupancy, since):
+        # Caller memegang self._lock; returns (alerts, timestamp terakhir atau None)
+        timestamps = pd.to_datetime(df_occupancy['timestamp'], errors='coerce')
+        mask = timestamps.notna().to_numpy()
+        if since is not None:
+            mask &= (timestamps > since).to_numpy()
+        if not mask.any():
+            return pd.DataFrame(columns=ALERT_COLUMNS), None
+
+        rows = df_occupancy[mask].assign(_ts=timestamps[mask])
+        alerts = [self._update_snapshot(snapshot) for _, snapshot in rows.groupby('_ts', sort=True)]
+        return pd.concat(alerts, ignore_index=True), rows['_ts'].max()
+
+    def log_alerts(self, alerts):
+        """
+        Append alert ke CSV log
+
+        Setiap worker menjalankan detector sendiri dan melihat alert yang
+        sama; di bawah file lock hanya alert yang lebih baru dari watermark
+        log yang ditulis, sehingga setiap alert tercatat sekali.
+        """
+        if self.alert_log_path == os.devnull:
+            return
+        watermark_path = f"{self.alert_log_path}.watermark"
+        with open(f"{self.alert_log_path}.lock", 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            timestamps = pd.to_datetime(alerts['timestamp'], errors='coerce')
+            try:
+                with open(watermark_path) as f:
+                    logged = pd.Timestamp(f.read().strip())
+                new = (timestamps > logged).to_numpy()
+                alerts, timestamps = alerts[new], timestamps[new]
+            except (OSError, ValueError):
+                pass
+            if len(alerts) == 0:
+                return
+            write_header = not os.path.exists(self.alert_log_path)
+            alerts.to_csv(self.alert_log_path, mode='a', header=write_header, index=False)
+            with open(watermark_path, 'w') as f:
+                f.write(timestamps.max().isoformat())
+
+    def save(self, path=STATE_PATH):
+        # Nama tmp per proses: worker lain bisa menyimpan state bersamaan
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with self._lock:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_or_build(cls, store=None, state_path=STATE_PATH, alert_log_path=ALERT_LOG_PATH):
+        """
+        Load state detector, lalu warm-up dari history (per shard region dari
+        ShardStore) jika file history berubah. Alert selama warm-up tidak
+        ditulis ke log.
+        """
+        detector = None
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'rb') as f:
+                    detector = pickle.load(f)
+            except Exception as e:
+                print(f"⚠️ State surge detector tidak valid, build ulang: {e}")
+        if detector is None:
+            detector = cls(alert_log_path)
+
+        store = store if store is not None else ShardStore()
+        history_mtime = store.history_version
+        if history_mtime is None:
+            return detector
+
+        if history_mtime != detector.history_mtime:
+            detector.warm_up(store.iter_occupancy_history())
+            detector.history_mtime = history_mtime
+            try:
+                detector.save(state_path)
+            except OSError as e:
+                print(f"⚠️ Gagal menyimpan state surge detector: {e}")
+        return detector
+
+
+if __name__ == "__main__":
+    detector = SurgeDetector(alert_log_path=os.devnull)
+    alerts = detector.warm_up(ShardStore().iter_occupancy_history())
+    print(f"✅ {len(alerts)} surge alerts in history, {len(detector.flagged)} flagged now")
+    print(alerts.tail(10).to_string(index=False))